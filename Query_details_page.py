@@ -1,119 +1,77 @@
 import streamlit as st
 from classes.ticket import Ticket
-from classifyAndResolve import resolve_ticket_general, resolve_ticket_specific, resolve_ticket
-from RAG import RAGRetriever
+from classifyAndResolve import resolve_ticket_general, resolve_ticket_specific, resolve_ticket, RESOLVER_PROMPT
+from context_packer import context_budget, tokenizer_for
+from RAG import RAGRetriever, scope_for_ticket
+from incident_index import get_incident_index
+from work_queue import RESOLVE_WAIT, apply_classification, start_background_workers
 import json
-# -------------------------
-# Custom CSS
-# -------------------------
-st.markdown("""
-    <style>
-    .ticket-card {
-        background-color: #ffffff;
-        padding: 25px;
-        border-radius: 14px;
-        box-shadow: 0 4px 16px rgba(0, 0, 0, 0.08);
-        margin-top: 20px;
-    }
-    .ticket-header {
-        font-size: 22px;
-        font-weight: 700;
-        color: #2c3e50;
-        margin-bottom: 20px;
-    }
-    .ticket-field {
-        font-size: 16px;
-        margin: 10px 0;
-        line-height: 1.5;
-    }
-    .ticket-label {
-        font-weight: 600;
-        color: #34495e;
-    }
-    .status-open {
-        background: #27ae60;
-        color: white;
-        padding: 3px 10px;
-        border-radius: 8px;
-        font-size: 14px;
-        font-weight: 600;
-    }
-    .status-pending {
-        background: #f39c12;
-        color: white;
-        padding: 3px 10px;
-        border-radius: 8px;
-        font-size: 14px;
-        font-weight: 600;
-    }
-    .status-closed {
-        background: #c0392b;
-        color: white;
-        padding: 3px 10px;
-        border-radius: 8px;
-        font-size: 14px;
-        font-weight: 600;
-    }
-    .section-title {
-        font-size: 18px;
-        font-weight: 600;
-        color: #2c3e50;
-        margin-top: 20px;
-        margin-bottom: 10px;
-    }
-    </style>
-""", unsafe_allow_html=True)
+from ui_components import inject_css, render_ticket_card
+
+
+@st.cache_resource
+def get_retriever():
+    """Embedding model and SOP indexes are built once per process, not per click"""
+    return RAGRetriever()
 
 
 # -------------------------
 # Render Ticket Details
 # -------------------------
 def render_ticket(ticket: Ticket):
-    # Convert values to safe strings
-    status = str(ticket.status)
-    raised_on = str(ticket.raised_on)
-    category = str(ticket.category)
-    sub_category = str(ticket.sub_category)
-    priority = str(ticket.priority)
-    assignment_group = str(ticket.assignment_group)
     description = str(ticket.description)
-
-    # Badge style for status
-    status_class = "status-open"
-    if status.lower() == "closed":
-        status_class = "status-closed"
-    elif status.lower() == "pending":
-        status_class = "status-pending"
+    # Pick up the queue's classification if the ticket was shown with a provisional one
+    apply_classification(ticket, start_background_workers().result(ticket.ticket_id))
 
     # Ticket card
-    st.markdown(f"""
-    <div class='ticket-card'>
-        <div class='ticket-header'>🎫 Ticket Details</div>
-        <div class="ticket-field"><span class="ticket-label">📂 Status:</span> <span class="{status_class}">{status}</span></div>
-        <div class="ticket-field"><span class="ticket-label">📅 Raised On:</span> {raised_on}</div>
-        <div class="ticket-field"><span class="ticket-label">🏷️ Category:</span> {category}</div>
-        <div class="ticket-field"><span class="ticket-label">🔖 Sub Category:</span> {sub_category}</div>
-        <div class="ticket-field"><span class="ticket-label">⚡ Priority:</span> {priority}</div>
-        <div class="ticket-field"><span class="ticket-label">👥 Assignment Group:</span> {assignment_group}</div>
-    </div>
-    """, unsafe_allow_html=True)
+    render_ticket_card(ticket, layout="details")
 
     # User Query
     st.markdown("<div class='section-title'>📝 User Query</div>", unsafe_allow_html=True)
     st.text_area("User Query", value=description, height=140, disabled=True, label_visibility="collapsed")
 
-    # Resolution button
+    render_resolution_controls(ticket, description)
+
+
+@st.fragment
+def render_resolution_controls(ticket: Ticket, description: str):
+    """Button and progress run as a fragment, so clicking it doesn't rerun the whole page"""
     if st.button("💡 Generate Resolution", use_container_width=True):
-        with st.status("⚙️ Working on resolution..."):
-            ticket_text = st.session_state.ticket.print_ticket()
-            st.write("Retriving Relevant Docs from knowledge base...")
-            retriever = RAGRetriever()
-            results = retriever.query(description, top_k=4)
-            print(json.dumps(results, indent=2, ensure_ascii=False)[:10000])
-            st.write("Creating context...")
-            context = retriever.get_prompt_text(results, max_chars=3500)[:5000]
-            st.write("Solving...")
-            resolution = resolve_ticket(description, context)
+        index = get_incident_index()
+        incident = index.incident_for(ticket)
+        queue = start_background_workers()
+        # A duplicate isn't queued itself; its parent's job resolves the incident
+        job_id = ticket.parent_id or ticket.ticket_id
+        queued = queue.result(job_id)
+        if queued is not None and queued["status"] not in ("done", "failed"):
+            with st.spinner("⏳ The work queue is resolving this ticket..."):
+                queued = queue.wait_past(job_id, "resolve", timeout=RESOLVE_WAIT) or queue.result(job_id)
+        resolution = None
+        if ticket.parent_id and incident is not None and incident.reusable_resolution is not None:
+            # The parent incident was resolved meanwhile; reuse it
+            resolution = incident.reusable_resolution
+        elif queued is not None and queued["status"] == "done" and "error" not in queued["resolution"]:
+            # The work queue already resolved this ticket in the background
+            resolution = queued["resolution"]
+        elif queued is not None and queued["status"] not in ("done", "failed"):
+            # Resolving inline too would pay for the same ticket twice
+            st.info("⏳ Still waiting in the work queue (the LLM may be rate limited). Try again shortly.")
+        else:
+            with st.status("⚙️ Working on resolution..."):
+                ticket_text = st.session_state.ticket.print_ticket()
+                st.write("Retriving Relevant Docs from knowledge base...")
+                retriever = get_retriever()
+                results = retriever.query(description, top_k=4, **scope_for_ticket(ticket))
+                print(json.dumps(results, indent=2, ensure_ascii=False)[:10000])
+                st.write("Creating context...")
+                budget = context_budget(RESOLVER_PROMPT, description)
+                context = retriever.get_prompt_text(results, max_tokens=budget, query=description,
+                                                    tokenizer_name=tokenizer_for("resolve"))
+                st.write("Solving...")
+                resolution = resolve_ticket(description, context)
+        if resolution is not None:
+            index.set_resolution(ticket, resolution)
+            ticket.resolution_details = resolution
             st.session_state["Resolution"] = resolution
             st.success("✅ Resolutions generated successfully!")
 
@@ -124,6 +82,7 @@ def render_ticket(ticket: Ticket):
 # -------------------------
 # Page Content
 # -------------------------
+inject_css()
 st.title("📋 Ticket Query Details")
 st.markdown(
     "Here you can review the details of your submitted ticket. "
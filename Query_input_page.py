@@ -1,23 +1,10 @@
 import streamlit as st
 from classes.ticket import Ticket
-import joblib
-import json
-from classifyAndResolve import classify_ticket
-
-
-# --- Classification Function ---
-def classify_category(description: str) -> str:
-    loaded_model = joblib.load("models/svm_tfidf_pipeline.pkl")
-    preds = loaded_model.predict([description])
-
-    with open("mappings/label_mappings.json") as f:
-        mappings = json.load(f)
-
-    id2label_loaded = mappings["id2label"]
-    preds = loaded_model.predict([description])
-    class_preds = [id2label_loaded[str(p)] for p in preds]
-
-    return class_preds[0].split("/")
+from classifyAndResolve import classify_ticket_rules
+from incident_index import get_incident_index
+from ticket_classifier import classify_category
+from work_queue import QueueFullError, apply_classification, start_background_workers
+from ui_components import inject_css, render_ticket_card
 
 
 # --- Page Layout ---
@@ -25,27 +12,7 @@ def query_input_page():
     st.set_page_config(page_title="Ticket Assistant", page_icon="🎫", layout="centered")
 
     # Header
-    st.markdown(
-        """
-        <style>
-        .main-title {
-            font-size: 2.2rem;
-            font-weight: 700;
-            color: #2C3E50;
-            text-align: center;
-            margin-bottom: 1rem;
-        }
-        .subtitle {
-            font-size: 1rem;
-            color: #7F8C8D;
-            text-align: center;
-            margin-bottom: 2rem;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
+    inject_css()
     st.markdown('<div class="main-title">🎫 Ticket Query Assistant</div>', unsafe_allow_html=True)
 
 
@@ -63,35 +30,54 @@ def query_input_page():
 
         if submitted and user_query.strip():
             ticket = Ticket(description=user_query)
-
-            with st.spinner("🔍 Classifying your ticket..."):
-                classification = classify_category(user_query)
-                ticket.category = ''.join(classification[:-1])
-                ticket.sub_category = classification[-1]
-
-            with st.spinner("👥 Assigning to the right group..."):
-                response = classify_ticket(ticket.print_ticket())
-                assignment_group = response.get("assignment_group")
-                priority = response.get("priority")
-                ticket.assignment_group = assignment_group
-                ticket.priority = priority
+            st.session_state.pop("Resolution", None)
+
+            index = get_incident_index()
+            incident = index.find_incident(user_query)
+            # Indexed before queueing, so the queue can record the resolution on its incident
+            index.add(ticket, incident)
+            if incident is not None:
+                # Near-duplicate of an open incident: inherit instead of re-running the pipeline
+                parent = incident.parent
+                ticket.parent_id = incident.incident_id
+                ticket.category = parent.category
+                ticket.sub_category = parent.sub_category
+                ticket.assignment_group = parent.assignment_group
+                ticket.priority = parent.priority
+                if incident.reusable_resolution is not None:
+                    ticket.resolution_details = incident.reusable_resolution
+                    st.session_state["Resolution"] = incident.reusable_resolution
+            else:
+                # New ticket: classify, retrieve and resolve in the priority work queue, so a
+                # Critical ticket overtakes the backlog; wait here only for its classification
+                queue = start_background_workers()
+                try:
+                    queue.enqueue(ticket)
+                    with st.spinner("🔍 Classifying your ticket and assigning it to the right group..."):
+                        job = queue.wait_past(ticket.ticket_id, "classify")
+                except QueueFullError as e:
+                    st.warning(f"⚠️ {e}")
+                    job = None
+                if not apply_classification(ticket, job):
+                    # Queue busy: show a provisional classification until the queue catches up
+                    classification = classify_category(user_query)
+                    ticket.category = ''.join(classification[:-1])
+                    ticket.sub_category = classification[-1]
+                    provisional = classify_ticket_rules(user_query)
+                    ticket.assignment_group = provisional["assignment_group"]
+                    ticket.priority = provisional["priority"]
+                    st.info("⏳ The work queue is busy or the LLM is rate limited; "
+                            "priority and group are provisional for now.")
 
             st.success("✅ Ticket created successfully!")
+            if incident is not None:
+                st.info(f"🔗 Linked to open incident **{incident.incident_id}** "
+                        f"({len(incident.children) + 1} similar tickets).")
 
             # Display ticket details in a nice card
             with st.container():
                 st.markdown("### 📌 Ticket Summary")
-                st.markdown(
-                    f"""
-                    <div style="background-color:#F9F9F9; padding:15px; border-radius:10px; border:1px solid #ddd;">
-                        <b>Description:</b> {ticket.description}<br>
-                        <b>Category:</b> {ticket.category} → {ticket.sub_category}<br>
-                        <b>Assignment Group:</b> {ticket.assignment_group}<br>
-                        <b>Priority:</b> {ticket.priority}
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+                render_ticket_card(ticket, layout="compact")
 
             st.session_state["ticket"] = ticket
 
@@ -1,21 +1,72 @@
+import json
+import re
 from pathlib import Path
 import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
+from context_packer import MAX_CONTEXT_TOKENS, TOKENIZER_NAME, split_passages, pack_context
 
 # ---------- Settings ----------
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
 TOP_K = 3
 DISTANCE_THRESHOLD = 0.2  # Minimum similarity threshold
+METADATA_FILE = "metadata.json"  # Optional per-PDF overrides: {"file.pdf": {"regions": [...], ...}}
+GLOBAL = "global"  # Metadata value for SOPs that apply everywhere
+
+# SVM sub-categories and SOP "Sub-Category:" headers -> SAP module
+MODULE_ALIASES = {
+    "fi": "FI",
+    "financial accounting": "FI",
+    "co": "CO",
+    "sap sd": "SD",
+    "sd": "SD",
+    "pm": "PM",
+    "qm": "QM",
+    "wm": "WM",
+    "ibp": "IBP",
+    "demand planning": "IBP",
+    "banking and treasury": "TRM",
+    "user account": "ACCESS",
+}
+# SOP "Category:" header -> default assignment group
+CATEGORY_GROUPS = {
+    "access/account": "TwO CG SAP Security",
+    "record to report": "TwO CG Record to Report",
+    "order to cash": "TwO CG Order to Cash",
+    "make to deliver": "TwO HYPERCARE Make to Deliver",
+    "forecast to supply": "TwO CG SAP Integration",
+}
+
+
+def module_for(sub_category):
+    if not sub_category:
+        return None
+    return MODULE_ALIASES.get(sub_category.strip().lower(), sub_category.strip().upper())
+
+
+def region_for(text):
+    """Region from a ticket's leading tag, e.g. "<FI France> ..." -> FI FRANCE"""
+    match = re.search(r"<([^<>]+)>", text or "")
+    return match.group(1).strip().upper() if match else None
+
+
+def scope_for_ticket(ticket):
+    """Retrieval filters for a ticket, driven by its SVM sub-category and region tag"""
+    return {"region": region_for(ticket.description), "module": module_for(ticket.sub_category)}
 
 
 class RAGRetriever:
     def __init__(self, folder: str = "D:\\AMS_POC\\AMS_POC\\Sops", embed_model_name=EMBED_MODEL_NAME):
+        # Imported here so the scope helpers above don't pull in the embedding stack
+        from sentence_transformers import SentenceTransformer
         self.model = SentenceTransformer(embed_model_name)
         self.pdf_texts = []       # Full text of each PDF
         self.metadatas = []       # Metadata for each PDF
+        self.passages = []        # Passages of each PDF, split once at ingestion
+        self.passage_embeddings = []  # Normalized embedding per passage, aligned with passages
         self.index = None
+        self.region_ids = {}      # region -> ids of SOPs tagged with it
+        self.module_ids = {}      # module -> ids of SOPs tagged with it
         self._build_from_folder(folder)
 
     def _extract_pdf_text(self, pdf_file):
@@ -39,12 +90,17 @@ class RAGRetriever:
         if not folder.exists():
             raise FileNotFoundError(f"Folder not found: {folder}")
 
+        overrides = {}
+        if (folder / METADATA_FILE).exists():
+            with open(folder / METADATA_FILE) as f:
+                overrides = json.load(f)
+
         for pdf_file in folder.glob("*.pdf"):
             text = self._extract_pdf_text(pdf_file)
             if not text:
                 continue
             self.pdf_texts.append(text)
-            self.metadatas.append({"source_file": pdf_file.name})
+            self.metadatas.append(self._extract_metadata(pdf_file.name, text, overrides.get(pdf_file.name, {})))
 
         if not self.pdf_texts:
             raise ValueError("No text found in PDFs.")
@@ -56,37 +112,107 @@ class RAGRetriever:
         faiss.normalize_L2(embeddings)
         self.index = faiss.IndexFlatIP(embeddings.shape[1])
         self.index.add(embeddings)
+        for i, metadata in enumerate(self.metadatas):
+            for region in metadata["regions"]:
+                self.region_ids.setdefault(region, set()).add(i)
+            for module in metadata["modules"]:
+                self.module_ids.setdefault(module, set()).add(i)
 
-    def query(self, query: str, top_k=TOP_K):
-        """Query FAISS and return top PDFs whose content matches the query"""
+        # Passages are embedded here once, so a query only has to embed itself
+        self.passages = [split_passages(text) for text in self.pdf_texts]
+        flat = [p for passages in self.passages for p in passages]
+        passage_embeddings = self.model.encode(flat, batch_size=32, convert_to_numpy=True)
+        faiss.normalize_L2(passage_embeddings)
+        start = 0
+        for passages in self.passages:
+            self.passage_embeddings.append(passage_embeddings[start:start + len(passages)])
+            start += len(passages)
+
+    def _extract_metadata(self, file_name, text, override):
+        """Region, module and assignment group for a SOP from its header, then metadata.json"""
+        header = {}
+        for line in text.splitlines()[:20]:
+            key, sep, value = line.partition(":")
+            if sep and key.strip().lower() in ("category", "sub-category", "group"):
+                header.setdefault(key.strip().lower(), value.strip())
+        category = header.get("category", "")
+        module = module_for(header.get("sub-category"))
+        group = CATEGORY_GROUPS.get(category.lower())
+        return {
+            "source_file": file_name,
+            "category": category or None,
+            "sop_group": header.get("group"),
+            "regions": override.get("regions", [GLOBAL]),
+            "modules": override.get("modules", [module] if module else [GLOBAL]),
+            "assignment_groups": override.get("assignment_groups", [group] if group else []),
+        }
+
+    def _filter_ids(self, region=None, module=None):
+        """Ids of the SOPs for the filters plus the global ones; unknown values match only global SOPs"""
+        global_regions = self.region_ids.get(GLOBAL, set())
+        global_modules = self.module_ids.get(GLOBAL, set())
+        regions = self.region_ids.get(region, set()) | global_regions if region else None
+        modules = self.module_ids.get(module, set()) | global_modules if module else None
+        if regions is None:
+            return modules
+        return regions if modules is None else regions & modules
+
+    def query(self, query: str, top_k=TOP_K, region=None, module=None, fallback=True, threshold=None):
+        """Query FAISS and return top PDFs whose content matches the query.
+
+        region/module restrict the search to that slice of the SOPs; with fallback, an
+        empty slice result retries against the whole index. threshold defaults to
+        DISTANCE_THRESHOLD.
+        """
+        threshold = DISTANCE_THRESHOLD if threshold is None else threshold
         q_emb = self.model.encode([query], convert_to_numpy=True)
         faiss.normalize_L2(q_emb)
-        distances, indices = self.index.search(q_emb, top_k)
+
+        ids = self._filter_ids(region, module) if (region or module) else None
+        if ids is not None:
+            # One shared index; the selector restricts the scan to the filtered slice
+            selector = faiss.IDSelectorBatch(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+            distances, indices = self.index.search(
+                q_emb, min(top_k, max(len(ids), 1)), params=faiss.SearchParameters(sel=selector))
+        else:
+            distances, indices = self.index.search(q_emb, top_k)
 
         results = []
         for idx, score in zip(indices[0], distances[0]):
-            if score >= DISTANCE_THRESHOLD:
+            if idx >= 0 and score >= threshold:
                 results.append({
+                    "id": int(idx),
                     "text": self.pdf_texts[idx],
                     "metadata": self.metadatas[idx],
                     "score": float(score)
                 })
+        if not results and ids is not None and fallback:
+            return self.query(query, top_k, threshold=threshold)
         return results
 
-    def get_prompt_text(self, results, max_chars=3000):
-        """Concatenate results into prompt-ready text"""
-        pieces, cur_len = [], 0
+    def get_passages(self, results, query: str = None):
+        """Passages of the retrieved PDFs, scored against the query when given"""
+        q_emb = None
+        if query:
+            q_emb = self.model.encode([query], convert_to_numpy=True)
+            faiss.normalize_L2(q_emb)
+        passages = []
         for r in results:
-            src = r["metadata"]["source_file"]
-            part = f"Source: {src}\n{r['text']}\n---\n"
-            if cur_len + len(part) > max_chars:
-                remaining = max_chars - cur_len
-                if remaining > 0:
-                    pieces.append(part[:remaining])
-                break
-            pieces.append(part)
-            cur_len += len(part)
-        return "\n".join(pieces)
+            doc_id = r["id"]
+            scores = self.passage_embeddings[doc_id] @ q_emb[0] if q_emb is not None else None
+            for pos, text in enumerate(self.passages[doc_id]):
+                passages.append({
+                    "text": text,
+                    "source": r["metadata"]["source_file"],
+                    "score": float(scores[pos]) if scores is not None else r["score"],
+                    "position": pos,
+                })
+        return passages
+
+    def get_prompt_text(self, results, max_tokens=MAX_CONTEXT_TOKENS, query: str = None,
+                        tokenizer_name=TOKENIZER_NAME):
+        """Pack the best passages from the results into a prompt-ready text of at most max_tokens"""
+        return pack_context(self.get_passages(results, query), max_tokens, tokenizer_name)
 
 
 # ---------- Usage ----------
@@ -1,5 +1,6 @@
 import streamlit as st
 from datetime import datetime
+from ui_components import inject_css, render_ticket_card
 
 # Sample ticket details
 def page():
@@ -11,23 +12,15 @@ def page():
     # Page config
     st.set_page_config(page_title="Ticket Escalation", page_icon="⚠️", layout="centered")
 
+    inject_css()
+
     # Header
     st.title("🤖 Ticket Requires Human Intervention")
     st.warning("The AI bot could not determine the resolution steps for this ticket. It has been escalated to the IT team.")
 
     # Ticket Card
     if ticket is not None:
-        st.markdown(f"""
-        <div class="card ticket-summary">
-            <h4>🎫 Ticket Summary</h4>
-            <p><b>Status:</b> {ticket.status} <br>
-            <b>Raised On:</b> {ticket.raised_on} <br>
-            <b>Category:</b> {ticket.category} → {ticket.sub_category} <br>
-            <b>Priority:</b> {ticket.priority} <br>
-            <b>Assignment Group:</b> {ticket.assignment_group} <br>
-            <b>User Query:</b> {ticket.description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        render_ticket_card(ticket)
 
     # Escalation Note
     st.error("⚠️Note: Ticket could not be resolved autonomously. A human IT Agent will take over to provide resolution.")
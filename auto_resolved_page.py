@@ -1,5 +1,52 @@
 import streamlit as st
 from datetime import datetime
+from ui_components import clear_finished_runs, finished_runs, inject_css, render_ticket_card, store_finished_runs
+from automation import DEFAULT_USER, FAILED_STATUSES, get_executor, plan_steps
+
+STATUS_ICONS = {"pending": "⏳", "running": "🔄", "success": "✅", "failed": "❌",
+                "timeout": "⌛", "blocked": "⛔", "skipped": "⏭️", "manual": "👨‍💻"}
+
+
+def render_run(slot, run):
+    slot.markdown(f"{STATUS_ICONS[run.status]} **Step {run.number}:** {run.text}  \n_{run.message or run.status}_")
+
+
+@st.fragment
+def run_automation(ticket, steps):
+    """Execute the steps once per ticket version, streaming status; reruns render the stored outcome.
+
+    A fragment, so retrying unfinished steps reruns only this part of the page.
+    """
+    runs = finished_runs(ticket, "auto")
+    executed = runs is None
+    if executed:
+        runs = plan_steps(steps, ticket.ticket_id, ticket.raised_by or DEFAULT_USER)
+    with st.status("⚙️ Executing automation steps...", expanded=True) as status:
+        slots = {run.index: st.empty() for run in runs}
+        for run in runs:
+            render_run(slots[run.index], run)
+        if executed:
+            for run in get_executor().run(runs, {"ticket_id": ticket.ticket_id,
+                                                 "user_id": ticket.raised_by or DEFAULT_USER}):
+                render_run(slots[run.index], run)
+        succeeded = all(run.status == "success" for run in runs)
+        status.update(label="Automation finished" if succeeded else "Automation needs attention",
+                      state="complete" if succeeded else "error")
+
+    # Resolution Note
+    if succeeded:
+        ticket.status = "closed"
+        st.success("✅ Resolution Applied: all automation steps completed successfully by the bot.")
+    else:
+        st.warning("⚠️ Some steps could not be completed automatically. A human IT Agent will follow up.")
+    # Stored after closing the ticket, under the version the next rerun will see
+    store_finished_runs(ticket, "auto", runs)
+
+    # Clicking reruns just this fragment; the executor reuses completed steps, so only unfinished ones repeat
+    if any(run.status in FAILED_STATUSES for run in runs):
+        st.button("🔁 Retry unfinished steps", key="auto_retry", on_click=clear_finished_runs,
+                  args=(ticket, "auto"))
+
 
 def page():
     # Sample ticket details
@@ -10,25 +57,21 @@ def page():
     # Page config
     st.set_page_config(page_title="Ticket Resolution", page_icon="✅", layout="centered")
 
+    inject_css()
+
     # Header
     st.title("🤖 Ticket Auto-Resolved")
     st.write("This ticket has been automatically resolved by the AI bot.")
 
     if ticket is not None:
-        st.markdown(f"""
-        <div class="card ticket-summary">
-            <h4>🎫 Ticket Summary</h4>
-            <p><b>Status:</b> {ticket.status} <br>
-            <b>Raised On:</b> {ticket.raised_on} <br>
-            <b>Category:</b> {ticket.category} → {ticket.sub_category} <br>
-            <b>Priority:</b> {ticket.priority} <br>
-            <b>Assignment Group:</b> {ticket.assignment_group} <br>
-            <b>User Query:</b> {ticket.description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        render_ticket_card(ticket)
 
-    # Resolution Note
-    st.success("✅ Resolution Applied: Password reset completed successfully by the bot.")
+    # Execute the automation steps, streaming each status change
+    resolution = st.session_state.get("Resolution", {})
+    if ticket is not None and resolution.get("steps"):
+        run_automation(ticket, resolution["steps"])
+    else:
+        st.info("ℹ️ No automation steps were returned for this ticket.")
 
     # Footer
     st.markdown("---")
@@ -0,0 +1,301 @@
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from mock_directory import MockDirectory, generate_temporary_password
+
+# ---------- Settings ----------
+MAX_WORKERS = 4
+STEP_TIMEOUT = 20.0      # Seconds before a running step is reported as timed out
+DEFAULT_USER = "demo.user"
+
+FAILED_STATUSES = {"failed", "timeout", "blocked", "skipped"}
+
+# action name -> {"handler", "patterns", "requires"}
+ACTIONS = {}
+
+
+def action(name, patterns, requires=(), guard=None):
+    """Register a handler(directory, ctx) -> message for resolution steps matching any pattern.
+
+    requires lists actions (or "*" for every other automated step) that must succeed first.
+    A guard action (guard = its step text) is added to any plan that needs it but left it
+    out; a dependent step whose non-guard prerequisite is missing is blocked instead.
+    """
+    def decorator(handler):
+        ACTIONS[name] = {"handler": handler, "patterns": [re.compile(p) for p in patterns],
+                         "requires": list(requires), "guard": guard}
+        return handler
+    return decorator
+
+
+def match_action(step_text: str):
+    text = step_text.lower()
+    if "escalate" in text:
+        return None
+    for name, spec in ACTIONS.items():
+        if any(p.search(text) for p in spec["patterns"]):
+            return name
+    return None
+
+
+# ---------- Password reset / unlock SOP actions ----------
+# Registration order is match order: more specific patterns first.
+@action("force_password_change", [r"force .*password change", r"must change password", r"change .*at next log"],
+        requires=["set_temporary_password"])
+def force_password_change(directory, ctx):
+    directory.force_password_change(ctx["user_id"])
+    return "User must change password at next login."
+
+
+@action("deliver_temporary_password", [r"(deliver|send|share) .*password"], requires=["set_temporary_password"])
+def deliver_temporary_password(directory, ctx):
+    address = directory.deliver_temporary_password(ctx["user_id"])
+    return f"Temporary password sent securely to {address}."
+
+
+@action("verify_identity", [r"verif\w* .*identity", r"confirm .*(caller|user)", r"verify user"],
+        guard="Verify the user's identity before changing the account.")
+def verify_identity(directory, ctx):
+    if not directory.verify_identity(ctx["user_id"]):
+        raise PermissionError(f"Could not verify identity of {ctx['user_id']}")
+    return "User identity verified."
+
+
+@action("check_account_status", [r"account status", r"(check|validate) if .*(locked|disabled|expired)"])
+def check_account_status(directory, ctx):
+    status = directory.account_status(ctx["user_id"])
+    flags = [k for k in ("locked", "disabled") if status[k]]
+    return f"Account is {', '.join(flags)}." if flags else "Account is active."
+
+
+@action("unlock_account", [r"unlock"], requires=["verify_identity"])
+def unlock_account(directory, ctx):
+    directory.unlock(ctx["user_id"])
+    return "Account unlocked."
+
+
+@action("set_temporary_password", [r"(generate|create|set|reset) .*password", r"password reset"],
+        requires=["verify_identity"])
+def set_temporary_password(directory, ctx):
+    password = generate_temporary_password()
+    # Only the directory keeps the password; nothing in ctx or the idempotency store sees it
+    directory.set_temporary_password(ctx["user_id"], password)
+    return "Temporary password generated."
+
+
+@action("notify_user", [r"(inform|notify|instruct) .*user", r"user instruction"],
+        requires=["deliver_temporary_password"])
+def notify_user(directory, ctx):
+    directory.send_secure_message(
+        ctx["user_id"], "Use the temporary password to log in and create a new password.")
+    return "User informed of next steps."
+
+
+@action("close_ticket", [r"\bclose\b", r"\bdocument\b"], requires=["*"])
+def close_ticket(directory, ctx):
+    return f"Actions documented for ticket {ctx['ticket_id']}."
+
+
+# ---------- Planning ----------
+class StepRun:
+    """One resolution step and its execution state"""
+
+    def __init__(self, index: int, text: str, action_name=None):
+        self.index = index
+        self.number = index + 1  # Step number shown to the user
+        self.text = text
+        self.action = action_name
+        self.requires = []
+        self.idempotency_key = None
+        self.status = "pending" if action_name else "manual"
+        self.message = "" if action_name else "No automation registered; needs a human."
+        self.started_at = None
+        self.finished_at = None
+
+
+def idempotency_key(ticket_id: str, action_name: str, user_id: str) -> str:
+    return hashlib.sha256(f"{ticket_id}:{action_name}:{user_id}".encode()).hexdigest()
+
+
+def plan_steps(steps, ticket_id: str, user_id: str = DEFAULT_USER):
+    """Map resolution step texts to registered actions and wire up their dependencies.
+
+    Prerequisites never depend on the model remembering them: missing guard actions are
+    inserted ahead of the first step that needs them, other missing ones block the step.
+    """
+    matched, seen = [], set()
+    for text in steps:
+        name = match_action(text)
+        if name in seen:
+            name = None  # The same action twice in one plan would only be deduplicated away
+        if name:
+            seen.add(name)
+        matched.append((text, name))
+
+    planned = []
+    for text, name in matched:
+        for req in ACTIONS[name]["requires"] if name else []:
+            if req != "*" and req not in seen and ACTIONS[req]["guard"]:
+                seen.add(req)
+                planned.append((ACTIONS[req]["guard"], req))
+        planned.append((text, name))
+
+    runs = []
+    for i, (text, name) in enumerate(planned):
+        run = StepRun(i, text, name)
+        if name:
+            run.idempotency_key = idempotency_key(ticket_id, name, user_id)
+        runs.append(run)
+
+    by_action = {r.action: r for r in runs if r.action}
+    for run in runs:
+        if not run.action:
+            continue
+        for req in ACTIONS[run.action]["requires"]:
+            if req == "*":
+                run.requires += [r.index for r in by_action.values() if r is not run]
+            elif req in by_action:
+                run.requires.append(by_action[req].index)
+            else:
+                run.status, run.message = "blocked", f"Needs '{req}', which is not part of this plan."
+    return runs
+
+
+class IdempotencyStore:
+    """Remembers completed actions so re-running a plan never repeats a side effect"""
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """(True, None) if the caller should run the action, else (False, prior result)"""
+        with self._lock:
+            if key in self._results:
+                return False, self._results[key]
+            self._results[key] = {"status": "running", "message": ""}
+            return True, None
+
+    def complete(self, key, message, ctx_updates):
+        with self._lock:
+            self._results[key] = {"status": "success", "message": message, "ctx": ctx_updates}
+
+    def status(self, key):
+        with self._lock:
+            return self._results.get(key, {}).get("status")
+
+    def release(self, key):
+        """Forget a failed attempt so it can be retried"""
+        with self._lock:
+            self._results.pop(key, None)
+
+
+# ---------- Execution ----------
+class AutomationExecutor:
+    """Runs independent steps concurrently on a worker pool with per-step timeouts"""
+
+    def __init__(self, directory=None, max_workers=MAX_WORKERS, step_timeout=STEP_TIMEOUT, store=None):
+        self.directory = directory or MockDirectory()
+        self.step_timeout = step_timeout
+        self.store = store or IdempotencyStore()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="automation")
+
+    def _invoke(self, run, ctx):
+        local = dict(ctx)
+        message = ACTIONS[run.action]["handler"](self.directory, local)
+        return message, {k: v for k, v in local.items() if k not in ctx or ctx[k] != v}
+
+    def _start(self, run, ctx):
+        """Submit a ready step, or settle it from the idempotency store; returns the future or None"""
+        claimed, prior = self.store.claim(run.idempotency_key)
+        if not claimed:
+            if prior["status"] == "success":
+                run.status, run.message = "success", f"{prior['message']} (already applied)"
+                ctx.update(prior.get("ctx", {}))
+            else:
+                run.status, run.message = "skipped", "Still running from an earlier attempt; outcome unknown."
+            return None
+        run.status, run.started_at = "running", time.time()
+        return self._pool.submit(self._invoke, run, dict(ctx))
+
+    def _settle(self, key, future):
+        """Record the real outcome of a step that was reported as timed out"""
+        if not future.cancelled() and future.exception() is None:
+            message, updates = future.result()
+            self.store.complete(key, message, updates)
+        else:
+            self.store.release(key)
+
+    def run(self, runs, ctx):
+        """Execute a plan, yielding each StepRun whenever its status changes (in the caller's thread)"""
+        ctx = dict(ctx)
+        by_index = {r.index: r for r in runs}
+        pending = [r for r in runs if r.status == "pending"]
+        running = {}  # future -> run
+
+        while pending or running:
+            progressed = False
+            for run in list(pending):
+                deps = [by_index[i] for i in run.requires]
+                if any(d.status in FAILED_STATUSES for d in deps):
+                    run.status, run.message = "blocked", "A prerequisite step did not succeed."
+                elif all(d.status == "success" for d in deps):
+                    future = self._start(run, ctx)
+                    if future is not None:
+                        running[future] = run
+                else:
+                    continue
+                pending.remove(run)
+                progressed = True
+                yield run
+
+            if not running:
+                if pending and not progressed:
+                    for run in pending:
+                        run.status, run.message = "blocked", "Prerequisites could not be scheduled."
+                        yield run
+                    pending = []
+                continue
+
+            next_deadline = min(r.started_at for r in running.values()) + self.step_timeout
+            done, _ = wait(running, timeout=max(0.0, next_deadline - time.time()), return_when=FIRST_COMPLETED)
+            for future in done:
+                run = running.pop(future)
+                run.finished_at = time.time()
+                try:
+                    run.message, updates = future.result()
+                    run.status = "success"
+                    ctx.update(updates)
+                    self.store.complete(run.idempotency_key, run.message, updates)
+                except Exception as e:
+                    run.status, run.message = "failed", str(e)
+                    self.store.release(run.idempotency_key)
+                yield run
+
+            now = time.time()
+            for future, run in list(running.items()):
+                if now - run.started_at >= self.step_timeout:
+                    # The worker can't be interrupted; stop waiting and let it finish in the background.
+                    # Its key stays claimed until the real outcome is known, so a rerun can't repeat it.
+                    running.pop(future)
+                    future.cancel()
+                    future.add_done_callback(lambda f, key=run.idempotency_key: self._settle(key, f))
+                    run.status, run.finished_at = "timeout", now
+                    run.message = f"No response within {self.step_timeout:.0f}s; outcome unknown."
+                    yield run
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> AutomationExecutor:
+    """Process-wide executor so idempotency holds across sessions and reruns"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = AutomationExecutor()
+        return _executor
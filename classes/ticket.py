@@ -1,8 +1,12 @@
+import uuid
 from datetime import datetime
 
 
 class Ticket:
     def __init__(self, description: str):
+        self.version = 0  # Bumped on every field change; keys cached renderings
+        self.ticket_id = uuid.uuid4().hex[:12]
+        self.parent_id = None  # Incident this ticket was linked to as a near-duplicate
         self.description = description
         self.short_description = None
         self.status = "open"
@@ -14,7 +18,12 @@ class Ticket:
         self.raised_by = None
         self.priority = None
         self.assignment_group = None
-        
+
+    def __setattr__(self, name, value):
+        if name != "version" and self.__dict__.get(name, value) is not value:
+            self.__dict__["version"] = self.__dict__.get("version", 0) + 1
+        super().__setattr__(name, value)
+
     def print_ticket(self):
         return f"""
                 User Query: {self.description}
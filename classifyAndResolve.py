@@ -1,10 +1,12 @@
-import os
+import re
 from dotenv import load_dotenv
+load_dotenv()  # Before anything reads provider settings from the environment
 from pydantic import BaseModel
 from typing import List
-from groq import Groq
 import json
-load_dotenv()
+from llm_providers import FakeProvider, TruncatedResponseError, get_provider, get_route, register_provider
+from llm_transport import LLMTransport
+from context_packer import output_tokens
 
 class TicketClassification(BaseModel):
     category: str
@@ -18,11 +20,58 @@ class TicketResolution(BaseModel):
     level: str
     solutions: list[str]
 
-api_key = os.environ.get("GROQ_TOKEN")
-MODEL_NAME = "openai/gpt-oss-20b"
+# One transport (and circuit breaker) per provider, so a degraded backend doesn't trip the others
+_transports = {}
 
-# Initialize your client
-client = Groq(api_key=api_key)
+
+def _get_transport(provider_name: str) -> LLMTransport:
+    if provider_name not in _transports:
+        _transports[provider_name] = LLMTransport()
+    return _transports[provider_name]
+
+
+def llm_backoff(task: str) -> float:
+    """Seconds to hold off work for a task because its provider is rate limited or degraded"""
+    provider_name, _ = get_route(task)
+    return _get_transport(provider_name).backoff_seconds()
+
+
+def _chat_json(task: str, system_prompt: str, user_content: str, max_tokens=None) -> str:
+    """Run one JSON-mode chat completion for a task on its routed provider/model.
+
+    max_tokens defaults to the task's output reservation; an answer cut off at that
+    limit is retried once with twice the room before the error is raised.
+    """
+    provider_name, model = get_route(task)
+    provider = get_provider(provider_name)
+    messages = [{"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}]
+
+    def complete(limit):
+        return _get_transport(provider_name).call(
+            lambda timeout: provider.complete_json(model, messages, temperature=0.2, timeout=timeout,
+                                                  max_tokens=limit)
+        )
+
+    max_tokens = max_tokens or output_tokens(task)
+    try:
+        return complete(max_tokens)
+    except TruncatedResponseError as e:
+        print(f"{task}: {e}; retrying with max_tokens={max_tokens * 2}")
+        return complete(max_tokens * 2)
+
+
+def _parse_json(raw_content: str) -> dict:
+    try:
+        # Try direct parse first
+        return json.loads(raw_content)
+    except Exception:
+        # Fallback: try to slice out JSON portion
+        start = raw_content.find("{")
+        end = raw_content.rfind("}")
+        if start != -1 and end != -1:
+            return json.loads(raw_content[start:end+1])
+        raise ValueError("No JSON object in model response")
 
 CLASSIFIER_PROMPT = """
 You are a hierarchical ticket classifier for SAP S/4HANA incidents. 
@@ -82,33 +131,73 @@ Output: {"category":"Record to Report","subcategory":"CO","assignment_group":"Tw
 NOW CLASSIFY the new short description strictly in the JSON schema above.
 """
 
-def classify_ticket(issue_text: str):
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "system", "content": CLASSIFIER_PROMPT},
-                  {"role": "user", "content": issue_text}],
-        temperature=0.2,
-        response_format={"type": "json_object"}
-    )
+# ---------- Rules-only fallback ----------
+# Used when the LLM is unavailable; mirrors the taxonomy and tie-breakers in CLASSIFIER_PROMPT.
+# The ticket text carries the SVM category, so its names are matched too.
+ASSIGNMENT_RULES = [
+    ("TwO Triaging & Support", ["test ticket", "triage"]),
+    ("TwO CG SAP Integration", ["interface", "sftp", "idoc", "blueplanner", "ibp", r"i03\w*", "inbound", "outbound", "forecast to supply"]),
+    ("TwO CG SAP Security", ["role", "roles", "authorization", "authorisation", "fiori", "access", "su53", "password", "locked", "unlock", "access/account"]),
+    ("TwO GMDM", ["bom", "master recipe", "production version", "valuation", "net weight", "pp1", "material master"]),
+    ("TwO CG Order to Cash", ["billing", "customer hierarchy", "sd", "fps", "sales order", "order to cash"]),
+    ("TwO D&A Support", ["reports", "reporting", "analyzer", "variance"]),
+    ("TwO HYPERCARE Make to Deliver", ["maintenance order", "production order", "work order", "make to deliver"]),
+]
+DEFAULT_ASSIGNMENT_GROUP = "TwO CG Record to Report"
+PRIORITY_RULES = [
+    ("Critical", ["all users", "all accounts", "outage", "system down", "production down", "critical"]),
+    ("High", ["not working", "error", "failed", "did not process", "wrong", "incorrect", "blocked", "unable"]),
+    ("Low", ["request", "enable", "how to", "question"]),
+]
+
+
+def _matches(text: str, keywords):
+    return [k for k in keywords if re.search(rf"\b{k}\b", text)]
+
+
+def classify_ticket_rules(issue_text: str):
+    """Keyword classification with the same output shape as classify_ticket"""
+    text = issue_text.lower()
+    assignment_group, signals = DEFAULT_ASSIGNMENT_GROUP, []
+    for group, keywords in ASSIGNMENT_RULES:
+        matched = _matches(text, keywords)
+        if matched:
+            assignment_group, signals = group, matched
+            break
+
+    # Regional overrides replace the CG flavor with the regional hypercare group
+    if assignment_group.startswith("TwO CG "):
+        domain = assignment_group[len("TwO CG "):]
+        if "<tna>" in text:
+            assignment_group = f"TwO TNA_{domain} HYPERCARE"
+        elif "<fi france>" in text:
+            assignment_group = f"TwO WER_{domain} HYPERCARE"
+
+    priority = "Medium"
+    for level, keywords in PRIORITY_RULES:
+        matched = _matches(text, keywords)
+        if matched:
+            priority, signals = level, signals + matched
+            break
+
+    return TicketClassification(
+        category="Record to Report",
+        subcategory="CO",
+        assignment_group=assignment_group,
+        confidence=0.3,
+        signals=signals + ["rules fallback"],
+        priority=priority,
+    ).model_dump()
 
-    raw_content = response.choices[0].message.content
-    # print("Raw result:\n", raw_content)
 
+def classify_ticket(issue_text: str):
     try:
-        # Try direct parse first
-        ticket = TicketClassification.model_validate_json(raw_content)
+        raw_content = _chat_json("classify", CLASSIFIER_PROMPT, issue_text)
+        ticket = TicketClassification.model_validate(_parse_json(raw_content))
         return ticket.model_dump()
-    except Exception:
-        # Fallback: try to slice out JSON portion
-        try:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start != -1 and end != -1:
-                json_str = raw_content[start:end+1]
-                ticket = TicketClassification.model_validate_json(json_str)
-                return ticket.model_dump()
-        except Exception as e:
-            print("Fallback parsing failed:", e)
+    except Exception as e:
+        print("LLM classification failed, using rules fallback:", e)
+        return classify_ticket_rules(issue_text)
 
 def resolve_ticket_specific(issue_text: str):
     SPECIFIC_SOLVER_PROMPT="""
@@ -128,79 +217,14 @@ Provide result strictly in JSON format with fields and no other commentaries:
 - level: L1, L2, or L3
 - solutions: List of step-by-step instructions
 """
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "system", "content": SPECIFIC_SOLVER_PROMPT},
-                  {"role": "user", "content": issue_text}],
-        temperature=0.2,
-        response_format={"type": "json_object"}
-    )
-
-    raw_content = response.choices[0].message.content
-    # print("Raw result:\n", raw_content)
-
-    try:
-        # Try direct parse first
-        result = TicketResolution.model_validate_json(raw_content)
-        return result.model_dump()
-    except Exception:
-        # Fallback: try to slice out JSON portion
-        try:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start != -1 and end != -1:
-                json_str = raw_content[start:end+1]
-                result = TicketResolution.model_validate_json(json_str)
-                return result.model_dump()
-        except Exception as e:
-            print("Fallback parsing failed:", e)
-            raise ValueError("Unable to parse raw content into TicketResolution")
-
-def resolve_ticket_general(issue_text: str):
-    GENERAL_SOLVER_PROMPT="""
-You are an expert IT support specialist with deep knowledge of ERP systems (e.g., SAP S/4HANA) and other IT systems. I will provide a single IT-related issue from a specific region or department. Your task is to:
-
-Classify the issue into one of the following IT support levels based on its complexity:
-
-L1 (Low Level): Simple issue requiring basic knowledge, such as user errors, standard transaction usage, or basic troubleshooting (e.g., checking settings, running reports, or guiding users through standard processes).
-L2 (Medium Level): Operational issue requiring moderate expertise, such as system configuration changes via standard customizing (e.g., updating master data, adjusting settings in SPRO, or scheduling batch jobs).
-L3 (High Level): Complex issue requiring advanced steps, such as custom code changes, ABAP development, debugging, or significant system modifications (e.g., enhancing user exits, fixing core system bugs, or addressing deep integration issues).
-
-Provide a step-by-step solution for the issue, tailored to its classified support level.
-If the issue references a specific incident number, note that historical context may need review but provide a general solution based on common practices.
-Ensure the solution is practical, follows best practices, and prioritizes system stability. Do not invent details; base the solution on standard processes and configurations. If clarification is needed for the issue, note it and provide a generalized approach.
-
-Provide result strictly in JSON format with fields and no other commentaries:
-- level: L1, L2, or L3
-- solutions: List of step-by-step instructions
-"""
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "system", "content": GENERAL_SOLVER_PROMPT},
-                  {"role": "user", "content": issue_text}],
-        temperature=0.2,
-        response_format={"type": "json_object"}
-    )
-
-    raw_content = response.choices[0].message.content
-    # print("Raw result:\n", raw_content)
+    raw_content = _chat_json("resolve_specific", SPECIFIC_SOLVER_PROMPT, issue_text)
 
     try:
-        # Try direct parse first
-        result = TicketResolution.model_validate_json(raw_content)
+        result = TicketResolution.model_validate(_parse_json(raw_content))
         return result.model_dump()
-    except Exception:
-        # Fallback: try to slice out JSON portion
-        try:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start != -1 and end != -1:
-                json_str = raw_content[start:end+1]
-                result = TicketResolution.model_validate_json(json_str)
-                return result.model_dump()
-        except Exception as e:
-            print("Fallback parsing failed:", e)
-            raise ValueError("Unable to parse raw content into TicketResolution")
+    except Exception as e:
+        print("Fallback parsing failed:", e)
+        raise ValueError("Unable to parse raw content into TicketResolution")
 
 
 def resolve_ticket_general(issue_text: str):
@@ -221,37 +245,17 @@ Provide result strictly in JSON format with fields and no other commentaries:
 - level: L1, L2, or L3
 - solutions: List of step-by-step instructions
 """
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "system", "content": GENERAL_SOLVER_PROMPT},
-                  {"role": "user", "content": issue_text}],
-        temperature=0.2,
-        response_format={"type": "json_object"}
-    )
-
-    raw_content = response.choices[0].message.content
-    # print("Raw result:\n", raw_content)
+    raw_content = _chat_json("resolve_general", GENERAL_SOLVER_PROMPT, issue_text)
 
     try:
-        # Try direct parse first
-        result = TicketResolution.model_validate_json(raw_content)
+        result = TicketResolution.model_validate(_parse_json(raw_content))
         return result.model_dump()
-    except Exception:
-        # Fallback: try to slice out JSON portion
-        try:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start != -1 and end != -1:
-                json_str = raw_content[start:end+1]
-                result = TicketResolution.model_validate_json(json_str)
-                return result.model_dump()
-        except Exception as e:
-            print("Fallback parsing failed:", e)
-            raise ValueError("Unable to parse raw content into TicketResolution")
+    except Exception as e:
+        print("Fallback parsing failed:", e)
+        raise ValueError("Unable to parse raw content into TicketResolution")
 
 
-def resolve_ticket(issue_text: str, context_text: str):
-    GENERAL_SOLVER_PROMPT = """
+RESOLVER_PROMPT = """
 You are an expert IT support specialist with access to the organization's SOPs and knowledge base.
 
 Your task is to:
@@ -272,6 +276,8 @@ Strictly return the result in JSON format:
 }
 """
 
+
+def resolve_ticket(issue_text: str, context_text: str):
     full_prompt = f"""
 Context (SOPs / Knowledge Base):
 {context_text}
@@ -280,31 +286,24 @@ Issue:
 {issue_text}
 """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {"role": "system", "content": GENERAL_SOLVER_PROMPT},
-            {"role": "user", "content": full_prompt}
-        ],
-        temperature=0.2,
-        response_format={"type": "json_object"}
-    )
-
-    raw_content = response.choices[0].message.content
-
     try:
-        # Try parsing directly
-        result = json.loads(raw_content)
-        return result
-    except Exception:
-        # Fallback: extract JSON manually
-        try:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start != -1 and end != -1:
-                json_str = raw_content[start:end+1]
-                result = json.loads(json_str)
-                return result
-        except Exception as e:
-            print("Fallback parsing failed:", e)
-            raise ValueError("Unable to parse raw content into resolution JSON")
+        return _parse_json(_chat_json("resolve", RESOLVER_PROMPT, full_prompt))
+    except Exception as e:
+        # Degraded provider or unparseable answer: hand the ticket to human staff
+        print("Resolution failed, escalating:", e)
+        return {"Solvability": "unsolvable", "steps": [], "error": str(e)}
+
+
+def _fake_responder(model, messages):
+    """Deterministic stand-in answers so the whole pipeline runs with LLM_PROVIDER=fake"""
+    system, user = messages[0]["content"], messages[-1]["content"]
+    if system == CLASSIFIER_PROMPT:
+        result = classify_ticket_rules(user)
+        result["signals"] = [s for s in result["signals"] if s != "rules fallback"] + ["fake provider"]
+        return json.dumps(result)
+    if system == RESOLVER_PROMPT:
+        return json.dumps({"Solvability": "partially automated", "steps": ["Escalate to human staff"]})
+    return json.dumps({"level": "L1", "solutions": []})
+
+
+register_provider("fake", FakeProvider(_fake_responder))
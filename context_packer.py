@@ -0,0 +1,159 @@
+import math
+import re
+from functools import lru_cache
+
+# ---------- Settings ----------
+TOKENIZER_NAME = "openai/gpt-oss-20b"  # Used when no model is known, e.g. when sizing passages
+# Hugging Face tokenizer per served model ID; models not listed are looked up under their own ID
+MODEL_TOKENIZERS = {
+    "llama-3.1-8b-instant": "meta-llama/Llama-3.1-8B-Instruct",
+}
+CONTEXT_WINDOW = 8192      # Prompt + output tokens we allow per request
+MAX_OUTPUT_TOKENS = 1024   # Room reserved for the model's answer when the task has no entry below
+# Per-task output reservation, sent as max_tokens; reasoning models spend part of it before the JSON
+TASK_OUTPUT_TOKENS = {
+    "classify": 512,
+    "resolve": 4096,
+    "resolve_specific": 4096,
+    "resolve_general": 4096,
+}
+MAX_CONTEXT_TOKENS = 1000  # Cap on packed SOP context, whatever the window leaves room for
+PROMPT_OVERHEAD = 64       # Chat template and wrapper text around the context
+PASSAGE_TOKENS = 160       # Target size of one packable passage
+DEDUP_THRESHOLD = 0.6      # Shingle Jaccard above which two passages count as duplicates
+SHINGLE_SIZE = 5
+CHARS_PER_TOKEN = 3.5      # Conservative estimate when the tokenizer can't be loaded
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(name: str = TOKENIZER_NAME):
+    """Load the Hugging Face tokenizer for the target model, or None when unavailable (e.g. offline)"""
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_pretrained(name)
+    except Exception as e:
+        print(f"Tokenizer '{name}' unavailable, estimating token counts:", e)
+        return None
+
+
+def count_tokens(text: str, tokenizer_name: str = TOKENIZER_NAME) -> int:
+    if not text:
+        return 0
+    tokenizer = get_tokenizer(tokenizer_name)
+    if tokenizer is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def output_tokens(task: str) -> int:
+    """max_tokens to request for a task"""
+    return TASK_OUTPUT_TOKENS.get(task, MAX_OUTPUT_TOKENS)
+
+
+def tokenizer_for_model(model: str) -> str:
+    return MODEL_TOKENIZERS.get(model, model)
+
+
+def tokenizer_for(task: str) -> str:
+    """Tokenizer of the model the task is currently routed to"""
+    from llm_providers import get_route  # llm_providers imports this module
+    return tokenizer_for_model(get_route(task)[1])
+
+
+def context_budget(system_prompt: str, user_text: str = "", task: str = "resolve",
+                   context_window=CONTEXT_WINDOW, max_context_tokens=MAX_CONTEXT_TOKENS) -> int:
+    """Tokens for retrieved context: what the window leaves after prompt, issue text and output, capped.
+
+    Counted with the tokenizer of the model the task is routed to.
+    """
+    tokenizer_name = tokenizer_for(task)
+    used = (count_tokens(system_prompt, tokenizer_name) + count_tokens(user_text, tokenizer_name)
+            + output_tokens(task) + PROMPT_OVERHEAD)
+    return max(0, min(max_context_tokens, context_window - used))
+
+
+def split_passages(text: str, max_tokens=PASSAGE_TOKENS):
+    """Split a document into passages on page/line/word boundaries, never mid-word"""
+    passages = []
+    for block in re.split(r"\n\s*\n", text):
+        lines, cur_tokens = [], 0
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            line_tokens = count_tokens(line)
+            if line_tokens > max_tokens:
+                # A single oversized line: fall back to word boundaries
+                if lines:
+                    passages.append("\n".join(lines))
+                    lines, cur_tokens = [], 0
+                words, piece = line.split(), []
+                for word in words:
+                    piece.append(word)
+                    if count_tokens(" ".join(piece)) > max_tokens and len(piece) > 1:
+                        passages.append(" ".join(piece[:-1]))
+                        piece = [word]
+                if piece:
+                    lines, cur_tokens = [" ".join(piece)], count_tokens(" ".join(piece))
+                continue
+            if lines and cur_tokens + line_tokens > max_tokens:
+                passages.append("\n".join(lines))
+                lines, cur_tokens = [], 0
+            lines.append(line)
+            cur_tokens += line_tokens
+        if lines:
+            passages.append("\n".join(lines))
+    return passages
+
+
+def _shingles(text: str):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_context(passages, max_tokens: int, tokenizer_name: str = TOKENIZER_NAME) -> str:
+    """Greedily pack passages by score-per-token into max_tokens, skipping near-duplicates.
+
+    Each passage is a dict with "text", "source" and "score"; "position" keeps the
+    original reading order within a source. Count with the same tokenizer as the budget.
+    """
+    candidates = []
+    for i, p in enumerate(passages):
+        tokens = count_tokens(p["text"], tokenizer_name)
+        if tokens == 0:
+            continue
+        candidates.append({**p, "tokens": tokens, "position": p.get("position", i),
+                           "shingles": _shingles(p["text"])})
+    candidates.sort(key=lambda c: c["score"] / c["tokens"], reverse=True)
+
+    chosen, used, sources = [], 0, set()
+    for c in candidates:
+        if any(_jaccard(c["shingles"], k["shingles"]) >= DEDUP_THRESHOLD for k in chosen):
+            continue
+        cost = c["tokens"]
+        if c["source"] not in sources:
+            cost += count_tokens(f"Source: {c['source']}\n---\n", tokenizer_name)
+        if used + cost > max_tokens:
+            continue
+        chosen.append(c)
+        sources.add(c["source"])
+        used += cost
+
+    # Emit grouped by source, best source first, passages in reading order
+    best = {}
+    for c in chosen:
+        best[c["source"]] = max(best.get(c["source"], float("-inf")), c["score"])
+    pieces = []
+    for src in sorted(best, key=best.get, reverse=True):
+        body = "\n".join(c["text"] for c in sorted(
+            (c for c in chosen if c["source"] == src), key=lambda c: c["position"]))
+        pieces.append(f"Source: {src}\n{body}\n---\n")
+    return "\n".join(pieces)
@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+from dotenv import load_dotenv
+load_dotenv()  # Before routes are read, here and in the worker processes
+from classes.ticket import Ticket
+from llm_providers import PROVIDER_FACTORIES, TASKS, USAGE, CassetteProvider, get_provider, register_provider
+
+# ---------- Settings ----------
+CASSETTE_PATH = "eval/cassette.jsonl"
+SOP_FOLDER = "Sops"
+DEFAULT_TOP_K = [4]
+DEFAULT_THRESHOLDS = [0.2]
+QUALITY_TOLERANCE = 0.02  # A config "holds quality" within this much of the best score
+QUALITY_METRICS = ["category_accuracy", "group_accuracy", "priority_accuracy", "recall_at_k", "mrr"]
+STAGES = ["classify_category", "classify_ticket", "retrieve", "resolve"]
+EVAL_RAISED_ON = "2025-01-01 00:00:00"  # Fixed so ticket prompts, and their cassette keys, are stable
+
+# Per worker process
+_retriever = None
+_cassettes = []
+
+
+# ---------- Data ----------
+def load_eval_set(path: str):
+    """Labeled tickets, one JSON object per line.
+
+    Only "description" is required; each metric uses the tickets that carry its label:
+    "label" (SVM category, e.g. "Record to Report / FI"), "assignment_group", "priority",
+    "relevant_sops" (SOP file names) and "solvability".
+    """
+    tickets = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            ticket = json.loads(line)
+            if not ticket.get("description"):
+                raise ValueError(f"{path}:{line_no}: missing 'description'")
+            tickets.append(ticket)
+    return tickets
+
+
+def install_cassette(path=CASSETTE_PATH, record=False):
+    """Route every known provider through the replay cassette; with record, misses go to the real provider.
+
+    All providers are wrapped, whatever the routes say, so a call can never bypass the
+    cassette and a missing response always shows up as a replay miss.
+    """
+    import classifyAndResolve  # noqa: F401  Registers the fake provider before it is wrapped
+    cassettes = []
+    for name in PROVIDER_FACTORIES:
+        inner = None
+        if record:
+            try:
+                inner = get_provider(name)
+            except Exception as e:
+                print(f"Not recording provider '{name}':", e)
+        cassettes.append(CassetteProvider(path, inner=inner, source=name))
+        register_provider(name, cassettes[-1])
+    return cassettes
+
+
+def _init_worker(cassette_path, record, sop_folder):
+    global _retriever, _cassettes
+    _cassettes = install_cassette(cassette_path, record)
+    from RAG import RAGRetriever
+    _retriever = RAGRetriever(folder=sop_folder)
+
+
+# ---------- Metrics ----------
+def _normalize_label(label: str) -> str:
+    return "/".join(part.strip() for part in label.split("/")).lower()
+
+
+def reciprocal_rank(sources, relevant) -> float:
+    for rank, source in enumerate(sources, start=1):
+        if source in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def recall_at_k(sources, relevant) -> float:
+    return len(set(sources) & set(relevant)) / len(relevant)
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _replayed_seconds():
+    return sum(c.replayed_seconds for c in _cassettes)
+
+
+class _Stopwatch:
+    """Latency and LLM tokens of one stage; replayed LLM calls count with their recorded latency"""
+
+    def __init__(self, latencies, tokens, stage):
+        self.latencies, self.tokens, self.stage = latencies, tokens, stage
+
+    def __enter__(self):
+        self._start, self._usage, self._replayed = time.perf_counter(), USAGE.totals(), _replayed_seconds()
+        return self
+
+    def __exit__(self, *exc):
+        replayed = _replayed_seconds() - self._replayed
+        self.latencies[self.stage].append(time.perf_counter() - self._start + replayed)
+        after = USAGE.totals()
+        self.tokens[self.stage] += (after["prompt_tokens"] + after["completion_tokens"]
+                                    - self._usage["prompt_tokens"] - self._usage["completion_tokens"])
+
+
+# ---------- Evaluation ----------
+def evaluate_config(config, tickets, retriever=None):
+    """Run the labeled tickets through the pipeline with one configuration and score it.
+
+    config keys: top_k, threshold, scoped (filter retrieval by region/module) and
+    routes ({task: "provider:model"}, applied as LLM_ROUTE_<TASK> for the run).
+    """
+    from ticket_classifier import classify_category
+    from classifyAndResolve import RESOLVER_PROMPT, classify_ticket, resolve_ticket
+    from context_packer import context_budget, tokenizer_for
+    from RAG import scope_for_ticket
+
+    retriever = retriever or _retriever
+    saved_env = {}
+    for task, route in config.get("routes", {}).items():
+        var = f"LLM_ROUTE_{task.upper()}"
+        saved_env[var] = os.environ.get(var)
+        os.environ[var] = route
+
+    latencies = {stage: [] for stage in STAGES}
+    tokens = {stage: 0 for stage in STAGES}
+    hits = {metric: [] for metric in QUALITY_METRICS + ["solvability_accuracy"]}
+    degraded = escalated = 0
+    misses = sum(c.misses for c in _cassettes)
+    try:
+        for item in tickets:
+            ticket = Ticket(description=item["description"])
+            ticket.raised_on = item.get("raised_on", EVAL_RAISED_ON)
+
+            with _Stopwatch(latencies, tokens, "classify_category"):
+                classification = classify_category(ticket.description)
+            ticket.category = ''.join(classification[:-1])
+            ticket.sub_category = classification[-1]
+            if item.get("label"):
+                predicted = "/".join(classification)
+                hits["category_accuracy"].append(_normalize_label(predicted) == _normalize_label(item["label"]))
+
+            with _Stopwatch(latencies, tokens, "classify_ticket"):
+                response = classify_ticket(ticket.print_ticket())
+            degraded += "rules fallback" in response.get("signals", [])
+            if item.get("assignment_group"):
+                hits["group_accuracy"].append(response.get("assignment_group") == item["assignment_group"])
+            if item.get("priority"):
+                hits["priority_accuracy"].append(response.get("priority") == item["priority"])
+
+            with _Stopwatch(latencies, tokens, "retrieve"):
+                scope = scope_for_ticket(ticket) if config.get("scoped", True) else {}
+                results = retriever.query(ticket.description, top_k=config["top_k"],
+                                          threshold=config["threshold"], **scope)
+                budget = context_budget(RESOLVER_PROMPT, ticket.description)
+                context = retriever.get_prompt_text(results, max_tokens=budget, query=ticket.description,
+                                                    tokenizer_name=tokenizer_for("resolve"))
+            if item.get("relevant_sops"):
+                sources = [r["metadata"]["source_file"] for r in results]
+                hits["recall_at_k"].append(recall_at_k(sources, item["relevant_sops"]))
+                hits["mrr"].append(reciprocal_rank(sources, item["relevant_sops"]))
+
+            with _Stopwatch(latencies, tokens, "resolve"):
+                resolution = resolve_ticket(ticket.description, context)
+            escalated += "error" in resolution
+            if item.get("solvability"):
+                hits["solvability_accuracy"].append(resolution.get("Solvability") == item["solvability"])
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+    n = len(tickets)
+    report = {"config": config, "tickets": n}
+    report.update({metric: _mean([float(h) for h in values]) for metric, values in hits.items()})
+    report["llm_fallback_rate"] = degraded / n if n else None
+    report["llm_error_rate"] = escalated / n if n else None
+    report["replay_misses"] = sum(c.misses for c in _cassettes) - misses
+    report["tokens_per_ticket"] = sum(tokens.values()) / n if n else None
+    for stage in STAGES:
+        report[f"{stage}_tokens"] = tokens[stage] / n if n else None
+        report[f"{stage}_ms"] = 1000 * _mean(latencies[stage]) if latencies[stage] else None
+        report[f"{stage}_p95_ms"] = 1000 * _percentile(latencies[stage], 0.95) if latencies[stage] else None
+    return report
+
+
+def build_configs(top_ks, thresholds, routes, scoped=(True,)):
+    """Cartesian product of the swept values; routes maps task -> list of "provider:model" choices"""
+    tasks = sorted(routes)
+    configs = []
+    for top_k, threshold, scope, choice in product(top_ks, thresholds, scoped,
+                                                   product(*(routes[t] for t in tasks))):
+        configs.append({"top_k": top_k, "threshold": threshold, "scoped": scope,
+                        "routes": dict(zip(tasks, choice))})
+    return configs
+
+
+def sweep(configs, tickets, workers=None, cassette_path=CASSETTE_PATH, record=False, sop_folder=SOP_FOLDER):
+    """Evaluate every config, spread across worker processes"""
+    if record:
+        workers = 1  # Recording appends to one cassette file; keep it to a single writer
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cassette_path, record, sop_folder)) as pool:
+        futures = [pool.submit(evaluate_config, config, tickets) for config in configs]
+        return [future.result() for future in futures]
+
+
+def cheapest(reports, metrics=QUALITY_METRICS, tolerance=QUALITY_TOLERANCE):
+    """Lowest tokens-per-ticket report whose quality is within tolerance of the best on every metric.
+
+    Reports with replay misses are left out: their fallbacks cost no tokens and would win unfairly.
+    """
+    reports = [r for r in reports if not r["replay_misses"]]
+    best = {m: max((r[m] for r in reports if r[m] is not None), default=None) for m in metrics}
+    holding = [r for r in reports
+               if all(best[m] is None or (r[m] is not None and r[m] >= best[m] - tolerance) for m in metrics)]
+    return min(holding, key=lambda r: (r["tokens_per_ticket"], r["retrieve_ms"] or 0), default=None)
+
+
+def format_table(reports, columns):
+    def cell(value):
+        if isinstance(value, float):
+            return f"{value:.3f}" if value < 10 else f"{value:.0f}"
+        return "-" if value is None else str(value)
+
+    rows = [["config"] + columns]
+    for r in reports:
+        c = r["config"]
+        label = f"k={c['top_k']} t={c['threshold']}" + ("" if c["scoped"] else " unscoped")
+        label += "".join(f" {task}={route.partition(':')[2]}" for task, route in c["routes"].items())
+        rows.append([label] + [cell(r.get(col)) for col in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in rows)
+
+
+def _parse_routes(values):
+    routes = {}
+    for value in values or []:
+        task, sep, route = value.partition("=")
+        if not sep or task not in TASKS:
+            raise argparse.ArgumentTypeError(f"--route expects TASK=provider:model with TASK in {list(TASKS)}")
+        routes.setdefault(task, []).append(route)
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline evaluation of classification, retrieval and resolution")
+    parser.add_argument("data", help="JSONL file of labeled tickets")
+    parser.add_argument("--cassette", default=CASSETTE_PATH, help="recorded LLM responses to replay")
+    parser.add_argument("--record", action="store_true",
+                        help="call the real providers for responses missing from the cassette and save them")
+    parser.add_argument("--top-k", type=int, nargs="+", default=DEFAULT_TOP_K)
+    parser.add_argument("--threshold", type=float, nargs="+", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--route", action="append", metavar="TASK=PROVIDER:MODEL",
+                        help="model to sweep for a task; repeat for several models or tasks")
+    parser.add_argument("--compare-unscoped", action="store_true",
+                        help="also run each config without region/module retrieval filters")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the sweep (default: all cores)")
+    parser.add_argument("--sops", default=SOP_FOLDER)
+    parser.add_argument("--output", help="write the full reports as JSON")
+    args = parser.parse_args()
+
+    try:
+        routes = _parse_routes(args.route)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.record:
+        os.makedirs(os.path.dirname(args.cassette) or ".", exist_ok=True)
+
+    tickets = load_eval_set(args.data)
+    configs = build_configs(args.top_k, args.threshold, routes,
+                            scoped=(True, False) if args.compare_unscoped else (True,))
+    reports = sweep(configs, tickets, args.workers, args.cassette, args.record, args.sops)
+
+    columns = QUALITY_METRICS + ["solvability_accuracy", "replay_misses", "tokens_per_ticket"]
+    columns += [f"{stage}_ms" for stage in STAGES]
+    print(format_table(reports, columns))
+    choice = cheapest(reports)
+    if choice is not None:
+        print("\nCheapest config holding quality:", json.dumps(choice["config"]))
+    missed = sum(r["replay_misses"] for r in reports)
+    if missed and not args.record:
+        print(f"\n{missed} LLM calls had no recorded response and fell back; configs with misses were left "
+              "out of the cheapest pick. Re-run with --record to fill the cassette.")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
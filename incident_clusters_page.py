@@ -0,0 +1,17 @@
+import streamlit as st
+from incident_index import get_incident_index
+
+st.title("🧩 Open Incidents")
+st.markdown(
+    "Near-duplicate tickets raised in the last 24 hours are grouped under the first ticket of each incident. "
+    "Linked tickets inherit the incident's classification and resolution."
+)
+st.divider()
+
+min_size = st.number_input("Minimum tickets per incident", min_value=1, value=2, step=1)
+clusters = get_incident_index().clusters(min_size=min_size)
+
+if clusters:
+    st.dataframe(clusters, use_container_width=True, hide_index=True)
+else:
+    st.info("ℹ️ No incidents with that many linked tickets.")
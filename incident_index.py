@@ -0,0 +1,202 @@
+import random
+import re
+import threading
+import time
+import zlib
+
+from RAG import region_for
+
+# ---------- Settings ----------
+NUM_PERM = 64              # MinHash signature length
+BANDS = 16                 # LSH bands; rows per band = NUM_PERM // BANDS
+SHINGLE_CHARS = 4
+DUPLICATE_THRESHOLD = 0.6  # Jaccard similarity at which a ticket joins an existing incident
+WINDOW_SECONDS = 24 * 3600 # Only recent tickets are matched against
+MAX_TICKETS = 5000
+# User IDs and e-mails named in a request ("unlock user JSMITH"). Requests for different
+# users are separate work even when the text is near-identical, so they are never linked.
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+USER_ID_PATTERN = re.compile(r"(?i:\b(?:user\s*id|user(?:name)?|account|for|unlock|reset)\s*[:#-]?\s*)([A-Z][A-Z0-9._]{3,})\b")
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1234)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str):
+    """Character shingles of the normalised text; robust for short ticket descriptions"""
+    text = " ".join(re.findall(r"\w+", text.lower()))
+    if len(text) <= SHINGLE_CHARS:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_CHARS] for i in range(len(text) - SHINGLE_CHARS + 1)}
+
+
+def user_ids(text: str):
+    text = text or ""
+    return frozenset(u.lower() for u in EMAIL_PATTERN.findall(text) + USER_ID_PATTERN.findall(text))
+
+
+def dedup_key(text: str):
+    """(scope, shingles): only tickets with the same region tag and user IDs can match,
+    and the user IDs are left out of the text similarity"""
+    text = text or ""
+    stripped = EMAIL_PATTERN.sub(" ", text)
+    # Keep the keyword ("user", "for", ...), drop the ID after it
+    stripped = USER_ID_PATTERN.sub(lambda m: m.group(0)[:m.start(1) - m.start(0)], stripped)
+    return (region_for(text), user_ids(text)), shingles(stripped)
+
+
+def minhash(shingle_set):
+    hashes = [zlib.crc32(s.encode()) for s in shingle_set]
+    if not hashes:
+        return tuple([_PRIME] * NUM_PERM)
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Incident:
+    """A parent ticket plus the near-duplicates linked to it"""
+
+    def __init__(self, parent):
+        self.incident_id = parent.ticket_id
+        self.parent = parent
+        self.children = []
+        self.resolution = None
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+
+    @property
+    def reusable_resolution(self):
+        """The resolution duplicates may inherit; a failed (errored) escalation never is"""
+        if self.resolution is None or "error" in self.resolution:
+            return None
+        return self.resolution
+
+    def summary(self):
+        return {
+            "incident_id": self.incident_id,
+            "description": self.parent.description,
+            "category": self.parent.category,
+            "sub_category": self.parent.sub_category,
+            "assignment_group": self.parent.assignment_group,
+            "priority": self.parent.priority,
+            "ticket_count": 1 + len(self.children),
+            "child_ticket_ids": list(self.children),
+            "resolved": self.resolution is not None,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created_at)),
+            "last_seen": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_seen)),
+        }
+
+
+class IncidentIndex:
+    """Online near-duplicate detector over recent tickets (MinHash + LSH banding)"""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, window_seconds=WINDOW_SECONDS, max_tickets=MAX_TICKETS):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.max_tickets = max_tickets
+        self.rows = NUM_PERM // BANDS
+        self._buckets = [dict() for _ in range(BANDS)]  # band -> {band hash: set(ticket ids)}
+        self._entries = {}                              # ticket id -> (added_at, shingles, signature, incident id, scope)
+        self._incidents = {}                            # incident id -> Incident
+        self._lock = threading.Lock()
+
+    def _bands(self, signature, scope):
+        # The scope is part of every band key, so out-of-scope tickets are never candidates
+        for band in range(BANDS):
+            yield band, hash((scope, signature[band * self.rows:(band + 1) * self.rows]))
+
+    def _evict(self, now):
+        expired = [tid for tid, entry in self._entries.items() if now - entry[0] > self.window_seconds]
+        overflow = len(self._entries) - len(expired) - self.max_tickets
+        if overflow > 0:
+            gone = set(expired)
+            alive = sorted((e[0], tid) for tid, e in self._entries.items() if tid not in gone)
+            expired += [tid for _, tid in alive[:overflow]]
+        for tid in expired:
+            _, _, signature, _, scope = self._entries.pop(tid)
+            for band, key in self._bands(signature, scope):
+                bucket = self._buckets[band].get(key)
+                if bucket:
+                    bucket.discard(tid)
+                    if not bucket:
+                        del self._buckets[band][key]
+        live = {entry[3] for entry in self._entries.values()}
+        for incident_id in list(self._incidents):
+            if incident_id not in live:
+                del self._incidents[incident_id]
+
+    def find_incident(self, description: str):
+        """Best matching open incident for a description (same region and users), or None"""
+        scope, sh = dedup_key(description)
+        signature = minhash(sh)
+        with self._lock:
+            self._evict(time.time())
+            candidates = set()
+            for band, key in self._bands(signature, scope):
+                candidates |= self._buckets[band].get(key, set())
+            best, best_score = None, self.threshold
+            for tid in candidates:
+                score = jaccard(sh, self._entries[tid][1])
+                if score >= best_score:
+                    best, best_score = self._incidents[self._entries[tid][3]], score
+            return best
+
+    def add(self, ticket, incident: Incident = None) -> Incident:
+        """Index a ticket, as a child of incident if given, otherwise as a new parent"""
+        scope, sh = dedup_key(ticket.description)
+        signature = minhash(sh)
+        now = time.time()
+        with self._lock:
+            if incident is None or incident.incident_id not in self._incidents:
+                incident = Incident(ticket)
+                self._incidents[incident.incident_id] = incident
+            else:
+                incident.children.append(ticket.ticket_id)
+                incident.last_seen = now
+            self._entries[ticket.ticket_id] = (now, sh, signature, incident.incident_id, scope)
+            for band, key in self._bands(signature, scope):
+                self._buckets[band].setdefault(key, set()).add(ticket.ticket_id)
+            return incident
+
+    def incident_for(self, ticket):
+        with self._lock:
+            entry = self._entries.get(ticket.ticket_id)
+            return self._incidents.get(entry[3]) if entry else None
+
+    def set_resolution(self, ticket, resolution):
+        """Record the resolution on the ticket's incident so later duplicates inherit it.
+
+        Resolutions carrying an "error" (LLM failure) are not recorded, so the next duplicate retries.
+        """
+        if "error" in resolution:
+            return
+        incident = self.incident_for(ticket)
+        if incident is not None and incident.reusable_resolution is None:
+            incident.resolution = resolution
+
+    def clusters(self, min_size=1):
+        """Summaries of live incidents, largest first"""
+        with self._lock:
+            self._evict(time.time())
+            summaries = [i.summary() for i in self._incidents.values()]
+        return sorted((s for s in summaries if s["ticket_count"] >= min_size),
+                      key=lambda s: s["ticket_count"], reverse=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_incident_index() -> IncidentIndex:
+    """Process-wide index shared by every session"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = IncidentIndex()
+        return _index
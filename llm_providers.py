@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+
+from context_packer import TOKENIZER_NAME, count_tokens, tokenizer_for_model
+
+# ---------- Settings ----------
+# Environment is read on use, not at import, so settings loaded later from .env still apply
+DEFAULT_PROVIDER = "groq"  # Unless LLM_PROVIDER is set
+DEFAULT_OPENAI_BASE_URL = "http://localhost:8000/v1"  # Unless OPENAI_BASE_URL is set
+
+TASKS = ("classify", "resolve", "resolve_specific", "resolve_general")
+DEFAULT_OPENAI_MODEL = "Qwen/Qwen2.5-7B-Instruct"  # Unless OPENAI_MODEL is set; whatever the server loaded
+
+# Per-task models on each provider, used for the provider LLM_PROVIDER names.
+# Override with e.g. LLM_ROUTE_CLASSIFY="openai:Qwen/Qwen2.5-7B-Instruct"
+TASK_ROUTES = {
+    "groq": {
+        "classify": "llama-3.1-8b-instant",
+        "resolve": "openai/gpt-oss-120b",
+        "resolve_specific": "openai/gpt-oss-120b",
+        "resolve_general": "openai/gpt-oss-120b",
+    },
+    "fake": {
+        "classify": "fake-classify",
+        "resolve": "fake-resolve",
+        "resolve_specific": "fake-resolve",
+        "resolve_general": "fake-resolve",
+    },
+}
+
+
+def default_provider() -> str:
+    return os.environ.get("LLM_PROVIDER") or DEFAULT_PROVIDER
+
+
+class ProviderError(Exception):
+    """A provider answered with an error status"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TruncatedResponseError(ProviderError):
+    """The model stopped at max_tokens (finish_reason "length"), so its JSON is incomplete"""
+
+    def __init__(self, model, max_tokens):
+        super().__init__(f"{model} stopped at max_tokens={max_tokens} before finishing its answer")
+        self.max_tokens = max_tokens
+
+
+class UsageMeter:
+    """Token usage summed per (provider, model) across all calls in this process"""
+
+    def __init__(self):
+        self._totals = {}
+        self._last = threading.local()
+        self._lock = threading.Lock()
+
+    def record(self, provider, model, prompt_tokens, completion_tokens):
+        with self._lock:
+            entry = self._totals.setdefault((provider, model), {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+        self._last.usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+    def last(self):
+        """Usage of the most recent call made from this thread"""
+        return getattr(self._last, "usage", None)
+
+    def totals(self) -> dict:
+        with self._lock:
+            entries = list(self._totals.values())
+        return {k: sum(e[k] for e in entries) for k in ("calls", "prompt_tokens", "completion_tokens")}
+
+    def by_model(self) -> dict:
+        with self._lock:
+            return {f"{p}:{m}": dict(e) for (p, m), e in self._totals.items()}
+
+
+USAGE = UsageMeter()
+
+
+def estimate_usage(messages, content, model=None):
+    """Token counts for backends that don't report usage"""
+    tokenizer_name = tokenizer_for_model(model) if model else TOKENIZER_NAME
+    return (sum(count_tokens(m["content"], tokenizer_name) for m in messages),
+            count_tokens(content, tokenizer_name))
+
+
+class ChatProvider(ABC):
+    """One chat-completions backend. complete_json returns the raw JSON-mode message content."""
+    name = "base"
+
+    @abstractmethod
+    def complete_json(self, model: str, messages, temperature=0.2, timeout=None, max_tokens=None) -> str: ...
+
+
+class GroqProvider(ChatProvider):
+    name = "groq"
+
+    def __init__(self, api_key=None):
+        import groq
+        self._groq = groq
+        # Retries are handled by the transport, not the SDK
+        self.client = groq.Groq(api_key=api_key or os.environ.get("GROQ_TOKEN"), max_retries=0)
+
+    def complete_json(self, model, messages, temperature=0.2, timeout=None, max_tokens=None):
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                response_format={"type": "json_object"},
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+        except self._groq.APITimeoutError as e:
+            raise TimeoutError(str(e)) from e
+        except self._groq.APIConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        except self._groq.APIStatusError as e:
+            raise ProviderError(str(e), e.status_code, e.response.headers.get("retry-after")) from e
+        content = response.choices[0].message.content
+        if response.usage is not None:
+            USAGE.record(self.name, model, response.usage.prompt_tokens, response.usage.completion_tokens)
+        else:
+            USAGE.record(self.name, model, *estimate_usage(messages, content, model))
+        if response.choices[0].finish_reason == "length":
+            raise TruncatedResponseError(model, max_tokens)
+        return content
+
+
+class OpenAICompatibleProvider(ChatProvider):
+    """Any server exposing POST /chat/completions, e.g. a local llama.cpp or vLLM server"""
+    name = "openai"
+
+    def __init__(self, base_url=None, api_key=None):
+        base_url = base_url or os.environ.get("OPENAI_BASE_URL") or DEFAULT_OPENAI_BASE_URL
+        headers = {}
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        self.client = httpx.Client(base_url=base_url.rstrip("/"), headers=headers)
+
+    def complete_json(self, model, messages, temperature=0.2, timeout=None, max_tokens=None):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "response_format": {"type": "json_object"},
+        }
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        try:
+            response = self.client.post("/chat/completions", json=payload, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        if response.status_code >= 400:
+            raise ProviderError(f"{response.status_code}: {response.text[:200]}", response.status_code,
+                                response.headers.get("retry-after"))
+        data = response.json()
+        content = data["choices"][0]["message"]["content"]
+        usage = data.get("usage")
+        if usage:
+            USAGE.record(self.name, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        else:
+            USAGE.record(self.name, model, *estimate_usage(messages, content, model))
+        if data["choices"][0].get("finish_reason") == "length":
+            raise TruncatedResponseError(model, max_tokens)
+        return content
+
+
+class FakeProvider(ChatProvider):
+    """Deterministic in-process provider for offline runs and tests.
+
+    responder(model, messages) returns the message content; without one, a JSON
+    object derived from a hash of the request is returned.
+    """
+    name = "fake"
+
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.calls = []
+
+    def complete_json(self, model, messages, temperature=0.2, timeout=None, max_tokens=None):
+        self.calls.append({"model": model, "messages": messages})
+        if self.responder is not None:
+            content = self.responder(model, messages)
+        else:
+            digest = hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+            content = json.dumps({"model": model, "digest": digest[:16]})
+        USAGE.record(self.name, model, *estimate_usage(messages, content, model))
+        return content
+
+
+class CassetteProvider(ChatProvider):
+    """Replays recorded responses keyed by (provider, model, messages, temperature, max_tokens).
+
+    With `inner`, unknown requests are sent to that provider and appended to the
+    cassette (record mode); without it, they fail with a 404 ProviderError, so runs
+    are offline and deterministic. The cassette is a JSONL file. Each entry keeps the
+    original call latency; replays add it to replayed_seconds so callers can report
+    realistic timings.
+    """
+    name = "cassette"
+
+    def __init__(self, path, inner: ChatProvider = None, source: str = None):
+        self.path = path
+        self.inner = inner
+        self.source = source or (inner.name if inner is not None else default_provider())
+        self.entries = {}
+        self.misses = 0
+        self.replayed_seconds = 0.0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def key(self, model, messages, temperature, max_tokens=None):
+        payload = json.dumps([self.source, model, messages, temperature, max_tokens], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def complete_json(self, model, messages, temperature=0.2, timeout=None, max_tokens=None):
+        key = self.key(model, messages, temperature, max_tokens)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self.replayed_seconds += entry.get("latency_ms", 0) / 1000
+            usage = entry.get("usage") or {}
+            USAGE.record(self.source, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            return entry["content"]
+        if self.inner is None:
+            with self._lock:
+                self.misses += 1
+            raise ProviderError(f"No recorded response for {self.source}:{model}", 404)
+
+        start = time.perf_counter()
+        content = self.inner.complete_json(model, messages, temperature, timeout, max_tokens)
+        entry = {"key": key, "provider": self.source, "model": model, "content": content,
+                 "usage": USAGE.last(), "latency_ms": 1000 * (time.perf_counter() - start)}
+        with self._lock:
+            if key not in self.entries:
+                self.entries[key] = entry
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return content
+
+
+PROVIDER_FACTORIES = {
+    "groq": GroqProvider,
+    "openai": OpenAICompatibleProvider,
+    "fake": FakeProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> ChatProvider:
+    """Shared provider instance by name, created on first use"""
+    with _providers_lock:
+        if name not in _providers:
+            if name not in PROVIDER_FACTORIES:
+                raise ValueError(f"Unknown LLM provider: {name}")
+            _providers[name] = PROVIDER_FACTORIES[name]()
+        return _providers[name]
+
+
+def register_provider(name: str, provider: ChatProvider):
+    """Install a ready-made provider instance, e.g. a FakeProvider with a custom responder"""
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def default_model(provider: str, task: str) -> str:
+    """The model a task uses on a provider when no route names one"""
+    if provider == "openai":
+        # One local server usually serves a single model for every task
+        return os.environ.get("OPENAI_MODEL") or DEFAULT_OPENAI_MODEL
+    models = TASK_ROUTES.get(provider)
+    if models is None:
+        raise ValueError(f"No default models for LLM provider '{provider}'; set LLM_ROUTE_{task.upper()}")
+    return models[task]
+
+
+def get_route(task: str):
+    """(provider name, model) for a task, honouring LLM_ROUTE_<TASK> and LLM_PROVIDER"""
+    spec = os.environ.get(f"LLM_ROUTE_{task.upper()}")
+    if not spec:
+        provider = default_provider()
+        return provider, default_model(provider, task)
+    provider, sep, model = spec.partition(":")
+    if not sep:
+        return default_provider(), spec
+    return provider, model
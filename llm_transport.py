@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
+
+# ---------- Settings ----------
+CALL_DEADLINE = 45.0       # Seconds for one logical LLM call, retries included
+MAX_ATTEMPTS = 4
+BACKOFF_MULTIPLIER = 0.5   # Jittered exponential backoff: random in [0, 0.5 * 2^n] seconds
+BACKOFF_MAX = 8.0
+HEDGE_PERCENTILE = 0.95    # Send a duplicate request once an attempt exceeds this latency percentile
+HEDGE_MIN_SAMPLES = 20     # Latency samples needed before hedging kicks in
+HEDGE_MIN_DELAY = 1.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+
+def status_code(exc):
+    """HTTP status carried by an SDK/HTTP exception, if any"""
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait (Retry-After), if it said"""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc) -> bool:
+    """Timeouts, connection errors, 429 and 5xx are worth retrying; anything else is not"""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = status_code(exc)
+    return code is not None and (code in RETRYABLE_STATUS or code >= 500)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after reset_timeout"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            # Let exactly one probe through while half-open
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class LLMTransport:
+    """Runs provider calls with a deadline, jittered retries, optional hedging and a circuit breaker.
+
+    `fn` passed to call() takes the per-attempt timeout in seconds and performs one request.
+    """
+
+    def __init__(self, deadline=CALL_DEADLINE, max_attempts=MAX_ATTEMPTS, hedge=True,
+                 retryable=is_retryable, breaker: CircuitBreaker = None, max_workers=8):
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self.retryable = retryable
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.rate_limited_until = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def hedge_delay(self):
+        if not self.hedge or len(self.latency) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, self.latency.percentile(HEDGE_PERCENTILE))
+
+    def backoff_seconds(self) -> float:
+        """How long callers should hold off: the provider's rate-limit window or an open circuit"""
+        now = time.monotonic()
+        wait_for = max(0.0, self.rate_limited_until - now)
+        opened_at = self.breaker.opened_at
+        if opened_at is not None and self.breaker.state == "open":
+            wait_for = max(wait_for, opened_at + self.breaker.reset_timeout - now)
+        return wait_for
+
+    def _timed(self, fn, timeout):
+        start = time.monotonic()
+        result = fn(timeout)
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    def _attempt(self, fn, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM call deadline exceeded")
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM provider circuit is open")
+
+        futures = [self._pool.submit(self._timed, fn, remaining)]
+        delay = self.hedge_delay()
+        done, _ = wait(futures, timeout=min(delay, remaining) if delay is not None else remaining)
+        if not done and delay is not None and delay < remaining:
+            # Slow tail: race a duplicate request against the original
+            futures.append(self._pool.submit(self._timed, fn, deadline_at - time.monotonic()))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.breaker.record_success()
+                    return future.result()
+                error = future.exception()
+
+        if error is None:
+            error = TimeoutError("LLM call deadline exceeded")
+        if status_code(error) == 429:
+            wait_for = retry_after(error) or BACKOFF_MAX
+            self.rate_limited_until = max(self.rate_limited_until, time.monotonic() + wait_for)
+        if self.retryable(error):
+            self.breaker.record_failure()
+        else:
+            # The provider answered; the request itself was bad
+            self.breaker.record_success()
+        raise error
+
+    def call(self, fn):
+        deadline_at = time.monotonic() + self.deadline
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_attempts) | stop_after_delay(self.deadline),
+            wait=wait_random_exponential(multiplier=BACKOFF_MULTIPLIER, max=BACKOFF_MAX),
+            retry=retry_if_exception(self.retryable),
+            reraise=True,
+        )
+        return retrying(self._attempt, fn, deadline_at)
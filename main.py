@@ -7,7 +7,9 @@ pages = {
     "Tickets" : [
         st.Page("Query_input_page.py", title="Ticket Query Input"),
         st.Page("Query_details_page.py", title="Ticket Details"),
-        st.Page("resolution_page.py", title="Ticket Resolution")
+        st.Page("resolution_page.py", title="Ticket Resolution"),
+        st.Page("incident_clusters_page.py", title="Open Incidents"),
+        st.Page("work_queue_page.py", title="Work Queue")
     ]
 }
 
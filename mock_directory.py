@@ -0,0 +1,107 @@
+import hashlib
+import secrets
+import string
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# ---------- Settings ----------
+TEMP_PASSWORD_LENGTH = 14
+DEFAULT_LATENCY = 0.2  # Seconds each call takes, to mimic a remote directory
+
+
+class DirectoryService(ABC):
+    """Operations the password reset / unlock SOP needs from AD or SAP user management"""
+
+    @abstractmethod
+    def verify_identity(self, user_id: str) -> bool: ...
+
+    @abstractmethod
+    def account_status(self, user_id: str) -> dict: ...
+
+    @abstractmethod
+    def unlock(self, user_id: str): ...
+
+    @abstractmethod
+    def set_temporary_password(self, user_id: str, password: str): ...
+
+    @abstractmethod
+    def deliver_temporary_password(self, user_id: str) -> str:
+        """Send the pending temporary password to the user over the secure channel; returns the address.
+
+        The password stays with the directory, so callers never have to hold on to it.
+        """
+
+    @abstractmethod
+    def force_password_change(self, user_id: str): ...
+
+    @abstractmethod
+    def send_secure_message(self, user_id: str, message: str) -> str: ...
+
+
+class MockDirectory(DirectoryService):
+    """In-memory directory used as the local/test backend for automated resolutions"""
+
+    def __init__(self, users=None, latency=DEFAULT_LATENCY):
+        self.latency = latency
+        self.users = users if users is not None else {
+            "demo.user": {"email": "demo.user@example.com", "locked": True, "disabled": False,
+                          "password_hash": None, "must_change": False},
+        }
+        self.outbox = []
+        self._pending_passwords = {}  # user id -> temporary password not yet delivered
+        self._lock = threading.Lock()
+
+    def _user(self, user_id):
+        time.sleep(self.latency)
+        if user_id not in self.users:
+            raise KeyError(f"Unknown user: {user_id}")
+        return self.users[user_id]
+
+    def verify_identity(self, user_id):
+        user = self._user(user_id)
+        return bool(user.get("email")) and not user["disabled"]
+
+    def account_status(self, user_id):
+        user = self._user(user_id)
+        with self._lock:
+            return {"locked": user["locked"], "disabled": user["disabled"], "must_change": user["must_change"]}
+
+    def unlock(self, user_id):
+        user = self._user(user_id)
+        with self._lock:
+            user["locked"] = False
+
+    def set_temporary_password(self, user_id, password):
+        user = self._user(user_id)
+        with self._lock:
+            user["password_hash"] = hashlib.sha256(password.encode()).hexdigest()
+            self._pending_passwords[user_id] = password
+
+    def deliver_temporary_password(self, user_id):
+        with self._lock:
+            password = self._pending_passwords.pop(user_id, None)
+        if password is None:
+            raise LookupError(f"No temporary password pending for {user_id}")
+        return self.send_secure_message(user_id, f"Your temporary password is {password}")
+
+    def force_password_change(self, user_id):
+        user = self._user(user_id)
+        with self._lock:
+            user["must_change"] = True
+
+    def send_secure_message(self, user_id, message):
+        user = self._user(user_id)
+        with self._lock:
+            self.outbox.append({"to": user["email"], "message": message})
+        return user["email"]
+
+
+def generate_temporary_password(length=TEMP_PASSWORD_LENGTH) -> str:
+    """Random password with upper, lower, digit and symbol, per the SOP's policy"""
+    alphabet = string.ascii_letters + string.digits + "!@#$%^&*-_"
+    while True:
+        password = "".join(secrets.choice(alphabet) for _ in range(length))
+        if (any(c.islower() for c in password) and any(c.isupper() for c in password)
+                and any(c.isdigit() for c in password) and any(not c.isalnum() for c in password)):
+            return password
@@ -1,4 +1,50 @@
 import streamlit as st
+from automation import DEFAULT_USER, FAILED_STATUSES, get_executor, plan_steps
+from ui_components import (clear_finished_runs, escalation_html, finished_runs, inject_css, render_ticket_card,
+                           step_html, store_finished_runs)
+
+
+@st.fragment
+def render_resolution_journey(ticket, steps):
+    """Execute the automated steps once per ticket version; reruns render the stored outcome.
+
+    A fragment, so retrying unfinished steps reruns only the journey.
+    """
+    runs = finished_runs(ticket, "partial")
+    executed = runs is None
+    if executed:
+        automated = [step for step in steps if "escalate" not in step.lower()]
+        runs = plan_steps(automated, ticket.ticket_id, ticket.raised_by or DEFAULT_USER)
+
+    # Lay out every step first, then update the automated ones in place as they execute.
+    # The plan may hold guard steps the model left out; they are shown before the step needing them.
+    slots = {}
+    step_count = 1
+    run_iter = iter(runs)
+    for step in steps:
+        if "escalate" in step.lower():
+            st.markdown(escalation_html(step_count, ticket.assignment_group), unsafe_allow_html=True)
+            step_count += 2
+            continue
+        for run in run_iter:
+            run.number = step_count
+            slots[run.index] = st.empty()
+            slots[run.index].markdown(step_html(run), unsafe_allow_html=True)
+            step_count += 1
+            if run.text == step:
+                break
+
+    if executed:
+        for run in get_executor().run(runs, {"ticket_id": ticket.ticket_id,
+                                             "user_id": ticket.raised_by or DEFAULT_USER}):
+            slots[run.index].markdown(step_html(run), unsafe_allow_html=True)
+        store_finished_runs(ticket, "partial", runs)
+
+    # Clicking reruns just this fragment; the executor reuses completed steps, so only unfinished ones repeat
+    if any(run.status in FAILED_STATUSES for run in runs):
+        st.button("🔁 Retry unfinished steps", key="partial_retry", on_click=clear_finished_runs,
+                  args=(ticket, "partial"))
+
 
 def page():
     # Page setup
@@ -9,63 +55,7 @@ def page():
         ticket = st.session_state["ticket"]
     else:
         ticket = None
-    # -------------------------
-    # Custom CSS for Professional Look
-    # -------------------------
-    st.markdown("""
-    <style>
-        .card {
-            background: #ffffff;
-            border-radius: 12px;
-            padding: 20px;
-            margin: 20px 0;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-        }
-        .ticket-summary {
-            background: linear-gradient(135deg, #f9fafb, #f3f4f6);
-            border-left: 6px solid #2563eb;
-        }
-        .workflow-step {
-            border-left: 4px solid #e5e7eb;
-            margin: 15px 0;
-            padding: 15px 20px;
-            border-radius: 8px;
-            background: #fafafa;
-            position: relative;
-        }
-        .workflow-step::before {
-            content: "●";
-            position: absolute;
-            left: -12px;
-            color: #2563eb;
-            font-size: 20px;
-        }
-        .ai {
-            border-left-color: #2563eb;
-            background: #f0f7ff;
-        }
-        .human {
-            border-left-color: #dc2626;
-            background: #fff5f5;
-        }
-        .step-title {
-            font-weight: 600;
-            font-size: 16px;
-            margin-bottom: 6px;
-        }
-        .badge {
-            display: inline-block;
-            padding: 2px 8px;
-            border-radius: 6px;
-            font-size: 12px;
-            font-weight: 600;
-            margin-left: 8px;
-        }
-        .success { background: #27ae60; color: white; }
-        .warning { background: #f39c12; color: white; }
-        .error { background: #c0392b; color: white; }
-    </style>
-    """, unsafe_allow_html=True)
+    inject_css()
 
     # -------------------------
     # Ticket Summary
@@ -73,47 +63,11 @@ def page():
     st.title("🤝 Ticket Resolution Workflow")
 
     if ticket is not None:
-        st.markdown(f"""
-        <div class="card ticket-summary">
-            <h4>🎫 Ticket Summary</h4>
-            <p><b>Status:</b> {ticket.status} <br>
-            <b>Raised On:</b> {ticket.raised_on} <br>
-            <b>Category:</b> {ticket.category} → {ticket.sub_category} <br>
-            <b>Priority:</b> {ticket.priority} <br>
-            <b>Assignment Group:</b> {ticket.assignment_group} <br>
-            <b>User Query:</b> {ticket.description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        render_ticket_card(ticket)
 
         # -------------------------
         # Workflow Steps
         # -------------------------
-        
         if "Resolution" in st.session_state:
             st.subheader("📍 Resolution Journey")
-            resolution = st.session_state["Resolution"]
-            step_count = 1
-            for step in resolution["steps"]:
-                if "escalate" in step.lower():
-                    st.markdown(f"""
-                                <div class="workflow-step ai">
-                                    <div class="step-title">🤖 Step {step_count}: Assigning Support Staff <span class="badge success">Suppport staff Assigned</span></div>
-                                    Assigned to <b>{ticket.assignment_group}</b>.
-                                </div>
-
-                                <div class="workflow-step human">
-                                    <div class="step-title">👨‍💻 Step {step_count + 1}: Support Team is working on resolution <span class="badge warning">In Progress</span></div>
-                                    Assigned to <b>{ticket.assignment_group}</b>. Resolution in progress.
-                                </div>
-                                """, unsafe_allow_html=True)
-                    step_count += 2
-                else:
-                    st.markdown(f"""
-                                <div class="workflow-step ai">
-                                    <div class="step-title">🤖 Step {step_count}: {step} <span class="badge success">Success</span></div>
-                                    
-                                </div>
-                                
-                                """, unsafe_allow_html=True)
-                    step_count += 1
-            
\ No newline at end of file
+            render_resolution_journey(ticket, st.session_state["Resolution"]["steps"])
@@ -0,0 +1,128 @@
+import time
+
+from automation import AutomationExecutor, plan_steps
+from mock_directory import MockDirectory
+
+STEPS = [
+    "Verify the user's identity",
+    "Check account status in SU01",
+    "Unlock the account",
+    "Generate a temporary password",
+    "Send the temporary password securely to the user",
+    "Close the ticket",
+]
+
+
+def _user(locked=True):
+    return {"email": "demo.user@example.com", "locked": locked, "disabled": False,
+            "password_hash": None, "must_change": False}
+
+
+def _run(executor, runs, ticket_id="T1"):
+    list(executor.run(runs, {"ticket_id": ticket_id, "user_id": "demo.user"}))
+    return {r.action or r.text: r for r in runs}
+
+
+def test_plan_wires_dependencies_and_runs_in_order():
+    directory = MockDirectory(latency=0)
+    runs = plan_steps(STEPS, "T1")
+    by_action = _run(AutomationExecutor(directory=directory), runs)
+
+    assert all(r.status == "success" for r in runs), [(r.action, r.status, r.message) for r in runs]
+    assert by_action["unlock_account"].started_at >= by_action["verify_identity"].finished_at
+    assert by_action["close_ticket"].started_at >= max(r.finished_at for r in runs if r.action != "close_ticket")
+    assert not directory.users["demo.user"]["locked"]
+    assert len(directory.outbox) == 1
+
+
+def test_missing_guard_is_inserted_before_privileged_step():
+    runs = plan_steps(["Unlock the account in SU01"], "T1")
+    assert [r.action for r in runs] == ["verify_identity", "unlock_account"]
+    assert runs[1].requires == [0]
+
+    directory = MockDirectory(users={"demo.user": dict(_user(), disabled=True)}, latency=0)
+    by_action = _run(AutomationExecutor(directory=directory), runs)
+    assert by_action["verify_identity"].status == "failed"
+    assert by_action["unlock_account"].status == "blocked"
+    assert directory.users["demo.user"]["locked"]
+
+
+def test_missing_non_guard_prerequisite_blocks_step():
+    runs = plan_steps(["Send the temporary password to the user"], "T1")
+    assert runs[0].action == "deliver_temporary_password"
+    assert runs[0].status == "blocked"
+
+    directory = MockDirectory(latency=0)
+    _run(AutomationExecutor(directory=directory), runs)
+    assert directory.outbox == []
+
+
+def test_rerun_reuses_completed_steps():
+    directory = MockDirectory(latency=0)
+    executor = AutomationExecutor(directory=directory)
+    _run(executor, plan_steps(STEPS, "T1"))
+    first_hash = directory.users["demo.user"]["password_hash"]
+
+    runs = plan_steps(STEPS, "T1")
+    _run(executor, runs)
+    assert all(r.status == "success" and "already applied" in r.message for r in runs)
+    assert directory.users["demo.user"]["password_hash"] == first_hash
+    assert len(directory.outbox) == 1
+
+
+def test_timed_out_step_is_not_repeated_while_still_running():
+    directory = MockDirectory(latency=0.5)
+    executor = AutomationExecutor(directory=directory, step_timeout=0.3)
+    steps = ["Verify the user's identity", "Generate a temporary password"]
+
+    by_action = _run(executor, plan_steps(steps, "T1"))
+    assert by_action["verify_identity"].status == "timeout"
+    assert by_action["set_temporary_password"].status == "blocked"
+
+    # A rerun while the first attempt is still in flight must not start it again
+    by_action = _run(executor, plan_steps(steps, "T1"))
+    assert by_action["verify_identity"].status == "skipped"
+
+    time.sleep(0.4)  # The background worker finishes and its real outcome is recorded
+    by_action = _run(executor, plan_steps(steps, "T1"))
+    assert by_action["verify_identity"].status == "success"
+    assert "already applied" in by_action["verify_identity"].message
+
+
+def test_timed_out_password_reset_runs_once():
+    directory = MockDirectory(latency=0.5)
+    executor = AutomationExecutor(directory=directory, step_timeout=0.3)
+    executor.store.complete(plan_steps(STEPS, "T1")[0].idempotency_key, "User identity verified.", {})
+    steps = ["Verify the user's identity", "Generate a temporary password"]
+
+    _run(executor, plan_steps(steps, "T1"))
+    first_hash_wait = time.time() + 1.0
+    while directory.users["demo.user"]["password_hash"] is None and time.time() < first_hash_wait:
+        time.sleep(0.05)
+    first_hash = directory.users["demo.user"]["password_hash"]
+
+    _run(executor, plan_steps(steps, "T1"))
+    time.sleep(0.6)
+    assert first_hash is not None
+    assert directory.users["demo.user"]["password_hash"] == first_hash
+
+
+def test_failed_step_can_be_retried():
+    directory = MockDirectory(users={"demo.user": dict(_user(), disabled=True)}, latency=0)
+    executor = AutomationExecutor(directory=directory)
+    steps = ["Verify the user's identity"]
+    assert _run(executor, plan_steps(steps, "T1"))["verify_identity"].status == "failed"
+
+    directory.users["demo.user"]["disabled"] = False
+    assert _run(executor, plan_steps(steps, "T1"))["verify_identity"].status == "success"
+
+
+def test_temporary_password_never_reaches_the_idempotency_store():
+    directory = MockDirectory(latency=0)
+    executor = AutomationExecutor(directory=directory)
+    _run(executor, plan_steps(STEPS, "T1"))
+
+    message = directory.outbox[0]["message"]
+    password = message.rsplit(" ", 1)[-1]
+    assert message.startswith("Your temporary password is")
+    assert password not in repr(executor.store._results)
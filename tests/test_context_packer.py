@@ -0,0 +1,55 @@
+import pytest
+
+import context_packer
+from context_packer import context_budget, count_tokens, pack_context, split_passages, tokenizer_for
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count with the character estimate so results don't depend on downloading tokenizers
+    monkeypatch.setattr(context_packer, "get_tokenizer", lambda name=None: None)
+
+
+def test_split_passages_respects_size_and_word_boundaries():
+    text = "Open SU01 and reset the password.\n" * 20 + "\n\n" + " ".join(f"word{i}" for i in range(200))
+    passages = split_passages(text, max_tokens=40)
+    assert len(passages) > 2
+    assert all(count_tokens(p) <= 40 for p in passages)
+    assert " ".join(passages).split() == text.split()
+
+
+def test_pack_context_fits_budget_and_skips_duplicates():
+    step = "Unlock the user in SU01 and send a new temporary password to the requester."
+    passages = [
+        {"text": step, "source": "a.pdf", "score": 0.9, "position": 1},
+        {"text": step + " Then confirm.", "source": "b.pdf", "score": 0.8, "position": 0},
+        {"text": "Check the role assignment in PFCG before unlocking.", "source": "a.pdf", "score": 0.7,
+         "position": 0},
+        {"text": "Unrelated filler about period close. " * 40, "source": "c.pdf", "score": 0.5},
+    ]
+    packed = pack_context(passages, max_tokens=80)
+    assert count_tokens(packed) <= 80
+    assert "b.pdf" not in packed and "c.pdf" not in packed
+    # Passages of one source come back in reading order
+    assert packed.index("PFCG") < packed.index("SU01")
+
+
+def test_context_budget_caps_and_shrinks_with_issue_text():
+    assert context_budget("system", "issue", max_context_tokens=500) == 500
+    roomy = context_budget("system", "issue", context_window=8000, max_context_tokens=10_000)
+    tight = context_budget("system", "issue " * 500, context_window=8000, max_context_tokens=10_000)
+    assert 0 < tight < roomy
+    assert context_budget("system", "issue " * 5000, context_window=8000) == 0
+
+
+def test_context_budget_reserves_output_per_task():
+    resolve = context_budget("system", context_window=6000, max_context_tokens=10_000, task="resolve")
+    classify = context_budget("system", context_window=6000, max_context_tokens=10_000, task="classify")
+    assert classify - resolve == context_packer.output_tokens("resolve") - context_packer.output_tokens("classify")
+
+
+def test_tokenizer_follows_task_route(monkeypatch):
+    monkeypatch.delenv("LLM_ROUTE_CLASSIFY", raising=False)
+    assert tokenizer_for("classify") == "meta-llama/Llama-3.1-8B-Instruct"
+    monkeypatch.setenv("LLM_ROUTE_CLASSIFY", "openai:Qwen/Qwen2.5-7B-Instruct")
+    assert tokenizer_for("classify") == "Qwen/Qwen2.5-7B-Instruct"
@@ -0,0 +1,49 @@
+from classes.ticket import Ticket
+from incident_index import IncidentIndex, dedup_key
+
+
+def _indexed(index, description):
+    ticket = Ticket(description=description)
+    incident = index.add(ticket, index.find_incident(description))
+    return ticket, incident
+
+
+def test_near_duplicates_join_one_incident():
+    index = IncidentIndex()
+    _, first = _indexed(index, "<UK> Monthly Inbound Accruals file from BluePlanner did not process")
+    _, second = _indexed(index, "<UK> Monthly Inbound Accruals file from BluePlanner did not process - file on SFTP")
+    assert second is first
+    assert len(first.children) == 1
+    assert index.clusters(min_size=2)[0]["ticket_count"] == 2
+
+
+def test_tickets_from_other_regions_are_not_linked():
+    index = IncidentIndex()
+    _indexed(index, "<TNA> FX Reval is booking to the wrong profit center")
+    assert index.find_incident("<UK> FX Reval is booking to the wrong profit center") is None
+    assert index.find_incident("FX Reval is booking to the wrong profit center") is None
+    assert index.find_incident("<TNA> FX Reval is booking to the wrong profit centre") is not None
+
+
+def test_requests_for_different_users_are_not_linked():
+    index = IncidentIndex()
+    _indexed(index, "Password locked, please unlock user JSMITH")
+    assert index.find_incident("Password locked, please unlock user AKUMAR") is None
+    assert index.find_incident("Password locked - please unlock user JSMITH") is not None
+
+
+def test_user_ids_are_left_out_of_the_similarity():
+    (_, users), shingles = dedup_key("Reset password for JSMITH or jane.doe@corp.com")
+    assert users == {"jsmith", "jane.doe@corp.com"}
+    assert not any("jsm" in s or "doe" in s for s in shingles)
+
+
+def test_errored_resolution_is_not_inherited():
+    index = IncidentIndex()
+    parent, incident = _indexed(index, "<UK> Billing document not released to accounting")
+    index.set_resolution(parent, {"Solvability": "unsolvable", "steps": [], "error": "timeout"})
+    assert incident.reusable_resolution is None
+    resolution = {"Solvability": "automated", "steps": ["Release billing document"]}
+    index.set_resolution(parent, resolution)
+    index.set_resolution(parent, {"Solvability": "unsolvable", "steps": []})
+    assert incident.reusable_resolution == resolution
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from llm_providers import USAGE, CassetteProvider, FakeProvider, ProviderError
+
+MESSAGES = [{"role": "system", "content": "classify"}, {"role": "user", "content": "password locked"}]
+
+
+def _slow(model, messages):
+    time.sleep(0.1)
+    return '{"priority": "High"}'
+
+
+def test_cassette_records_then_replays_with_latency_and_usage(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    inner = FakeProvider(_slow)
+    recorder = CassetteProvider(path, inner=inner, source="fake")
+    assert recorder.complete_json("m", MESSAGES, max_tokens=64) == '{"priority": "High"}'
+    assert len(inner.calls) == 1
+
+    replay = CassetteProvider(path, source="fake")
+    before = USAGE.totals()
+    assert replay.complete_json("m", MESSAGES, max_tokens=64) == '{"priority": "High"}'
+    assert USAGE.totals()["prompt_tokens"] > before["prompt_tokens"]
+    assert replay.replayed_seconds >= 0.1
+    assert replay.misses == 0
+
+
+def test_cassette_miss_fails_without_provider(tmp_path):
+    replay = CassetteProvider(str(tmp_path / "empty.jsonl"), source="fake")
+    with pytest.raises(ProviderError) as exc:
+        replay.complete_json("m", MESSAGES)
+    assert exc.value.status_code == 404
+    assert replay.misses == 1
+
+
+def test_cassette_key_depends_on_model_and_max_tokens(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    CassetteProvider(path, inner=FakeProvider(lambda m, msgs: "{}"), source="fake").complete_json("a", MESSAGES)
+    replay = CassetteProvider(path, source="fake")
+    for model, max_tokens in (("b", None), ("a", 128)):
+        with pytest.raises(ProviderError):
+            replay.complete_json(model, MESSAGES, max_tokens=max_tokens)
+
+
+def test_truncated_answer_is_retried_with_more_room(monkeypatch):
+    from classifyAndResolve import _chat_json
+    from llm_providers import ChatProvider, TruncatedResponseError, register_provider
+
+    class Truncating(ChatProvider):
+        def __init__(self):
+            self.limits = []
+
+        def complete_json(self, model, messages, temperature=0.2, timeout=None, max_tokens=None):
+            self.limits.append(max_tokens)
+            if len(self.limits) == 1:
+                raise TruncatedResponseError(model, max_tokens)
+            return "{}"
+
+    provider = Truncating()
+    register_provider("truncating", provider)
+    monkeypatch.setenv("LLM_ROUTE_CLASSIFY", "truncating:m")
+    assert _chat_json("classify", "system", "issue") == "{}"
+    assert provider.limits == [512, 1024]
+
+
+def test_default_models_follow_the_provider(monkeypatch):
+    from llm_providers import get_route
+
+    monkeypatch.delenv("LLM_ROUTE_RESOLVE", raising=False)
+    monkeypatch.delenv("OPENAI_MODEL", raising=False)
+    monkeypatch.setenv("LLM_PROVIDER", "groq")
+    assert get_route("resolve") == ("groq", "openai/gpt-oss-120b")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_MODEL", "local-model")
+    assert get_route("resolve") == ("openai", "local-model")
+    monkeypatch.setenv("LLM_ROUTE_RESOLVE", "groq:llama-3.1-8b-instant")
+    assert get_route("resolve") == ("groq", "llama-3.1-8b-instant")
+
+
+def test_install_cassette_wraps_every_provider(tmp_path, monkeypatch):
+    import evaluate
+    import llm_providers
+    from classifyAndResolve import classify_ticket
+
+    monkeypatch.setattr(llm_providers, "_providers", dict(llm_providers._providers))
+    cassettes = evaluate.install_cassette(str(tmp_path / "empty.jsonl"))
+    assert {c.source for c in cassettes} == set(llm_providers.PROVIDER_FACTORIES)
+
+    # Whatever LLM_PROVIDER names, the call is replayed and an unrecorded one counts as a miss
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    assert "rules fallback" in classify_ticket("Password locked for JSMITH")["signals"]
+    assert sum(c.misses for c in cassettes) == 1
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import llm_transport
+from llm_providers import FakeProvider, ProviderError
+from llm_transport import CircuitBreaker, CircuitOpenError, LLMTransport
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _call(transport, provider):
+    return transport.call(lambda timeout: provider.complete_json("m", MESSAGES, timeout=timeout))
+
+
+def test_breaker_opens_after_threshold_and_probes_once_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_half_open_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_open_breaker_fails_fast_without_calling_provider():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    provider = FakeProvider(lambda model, messages: "{}")
+    with pytest.raises(CircuitOpenError):
+        _call(LLMTransport(breaker=breaker, hedge=False), provider)
+    assert provider.calls == []
+
+
+def test_non_retryable_4xx_is_raised_after_one_attempt():
+    def responder(model, messages):
+        raise ProviderError("bad request", status_code=400)
+
+    provider = FakeProvider(responder)
+    transport = LLMTransport(max_attempts=4, hedge=False)
+    with pytest.raises(ProviderError):
+        _call(transport, provider)
+    assert len(provider.calls) == 1
+    assert transport.breaker.failures == 0  # The provider is healthy; the request was bad
+
+
+def test_retryable_error_is_retried_until_success(monkeypatch):
+    monkeypatch.setattr(llm_transport, "BACKOFF_MULTIPLIER", 0.01)
+    outcomes = [ProviderError("unavailable", status_code=503), ConnectionError("reset")]
+
+    def responder(model, messages):
+        if outcomes:
+            raise outcomes.pop(0)
+        return '{"ok": true}'
+
+    provider = FakeProvider(responder)
+    transport = LLMTransport(max_attempts=4, hedge=False)
+    assert transport.call(lambda timeout: provider.complete_json("m", MESSAGES)) == '{"ok": true}'
+    assert len(provider.calls) == 3
+    assert transport.breaker.failures == 0
+
+
+def test_rate_limit_sets_backoff_from_retry_after():
+    def responder(model, messages):
+        raise ProviderError("slow down", status_code=429, retry_after="5")
+
+    transport = LLMTransport(max_attempts=1, hedge=False)
+    with pytest.raises(ProviderError):
+        _call(transport, FakeProvider(responder))
+    assert 4 < transport.backoff_seconds() <= 5
+
+
+def test_hedged_request_wins_over_slow_original(monkeypatch):
+    monkeypatch.setattr(llm_transport, "HEDGE_MIN_DELAY", 0.05)
+    transport = LLMTransport(hedge=True)
+    for _ in range(llm_transport.HEDGE_MIN_SAMPLES):
+        transport.latency.record(0.01)
+
+    calls = []
+
+    def responder(model, messages):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return "original"
+        return "hedge"
+
+    start = time.monotonic()
+    assert _call(transport, FakeProvider(responder)) == "hedge"
+    assert time.monotonic() - start < 0.5
+    assert len(calls) == 2
+
+
+def test_no_hedging_before_enough_latency_samples():
+    transport = LLMTransport(hedge=True)
+    assert transport.hedge_delay() is None
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+import incident_index
+import work_queue
+from classes.ticket import Ticket
+from incident_index import IncidentIndex
+from work_queue import QueueFullError, WorkerPool, WorkQueue
+
+
+def _ticket(description, priority="Medium", group="TwO CG Record to Report"):
+    ticket = Ticket(description=description)
+    ticket.priority = priority
+    ticket.assignment_group = group
+    return ticket
+
+
+def _drain(queue):
+    order = []
+    while (job := queue.dequeue()) is not None:
+        order.append(job["payload"]["ticket"]["description"])
+    return order
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "jobs.db"))
+
+
+def test_dequeue_serves_best_priority_first(queue):
+    queue.enqueue(_ticket("low", "Low"))
+    queue.enqueue(_ticket("medium", "Medium"))
+    queue.enqueue(_ticket("critical", "Critical"))
+    queue.enqueue(_ticket("high", "High"))
+    assert _drain(queue) == ["critical", "high", "medium", "low"]
+
+
+def test_dequeue_round_robins_groups_within_a_priority(queue):
+    queue.enqueue(_ticket("a1", group="A"))
+    queue.enqueue(_ticket("a2", group="A"))
+    queue.enqueue(_ticket("a3", group="A"))
+    queue.enqueue(_ticket("b1", group="B"))
+    queue.enqueue(_ticket("b2", group="B"))
+    assert _drain(queue) == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_enqueue_uses_provisional_rules_priority(queue):
+    queue.enqueue(Ticket(description="production down for all users"))
+    job = queue.dequeue()
+    assert job["priority"] == "Critical"
+
+
+def test_advance_reranks_next_stage_by_classified_priority(queue):
+    queue.enqueue(_ticket("first", "High"))
+    queue.enqueue(_ticket("second", "Low"))
+    job = queue.dequeue()
+    job["payload"]["ticket"]["priority"] = "Low"
+    queue.advance(job, job["payload"])
+    low = queue.dequeue()
+    assert low["payload"]["ticket"]["description"] == "second"  # Enqueued earlier at the same priority
+    assert queue.dequeue()["stage"] == "retrieve"
+
+
+def test_dequeue_filters_stages(queue):
+    queue.enqueue(_ticket("t"))
+    assert queue.dequeue(stages=[]) is None
+    assert queue.dequeue(stages=["resolve"]) is None
+    assert queue.dequeue(stages=["classify"])["stage"] == "classify"
+
+
+def test_fail_retries_after_delay_then_gives_up(queue):
+    ticket = _ticket("t")
+    queue.enqueue(ticket)
+    job = queue.dequeue()
+    queue.fail(job, "boom", delay=60)
+    assert queue.dequeue() is None  # Not available until the retry delay passes
+    assert queue.result(ticket.ticket_id)["status"] == "queued"
+
+    for attempt in range(1, work_queue.MAX_ATTEMPTS):
+        job["attempts"] = attempt
+        queue.fail(job, "boom", delay=0)
+    result = queue.result(ticket.ticket_id)
+    assert result["status"] == "failed"
+    assert result["error"] == "boom"
+    assert queue.dequeue() is None
+
+
+def test_enqueue_refuses_past_max_depth(tmp_path):
+    queue = WorkQueue(str(tmp_path / "jobs.db"), max_depth=1)
+    queue.enqueue(_ticket("t1"))
+    with pytest.raises(QueueFullError):
+        queue.enqueue(_ticket("t2"))
+
+
+class _Retriever:
+    def query(self, query, top_k=4, **filters):
+        return [{"text": "Reset the password in SU01.", "metadata": {"source_file": "sop.pdf"}, "score": 1.0}]
+
+    def get_prompt_text(self, results, max_tokens=1000, query=None, tokenizer_name=None):
+        return results[0]["text"]
+
+
+def test_worker_pool_runs_every_stage_with_fake_provider(queue, monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    index = IncidentIndex()
+    monkeypatch.setattr(incident_index, "_index", index)
+    ticket = Ticket(description="Password locked, please reset")
+    index.add(ticket)
+    queue.enqueue(ticket)
+    pool = WorkerPool(queue, num_workers=2, retriever_factory=_Retriever)
+
+    async def run_until_done():
+        task = asyncio.create_task(pool.run())
+        for _ in range(200):
+            if queue.result(ticket.ticket_id)["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.05)
+        pool.stop()
+        await task
+
+    asyncio.run(run_until_done())
+    result = queue.result(ticket.ticket_id)
+    assert result["status"] == "done", result["error"]
+    assert result["ticket"]["assignment_group"] == "TwO CG SAP Security"
+    assert result["context"] == "Reset the password in SU01."
+    assert result["resolution"]["Solvability"] == "partially automated"
+    assert work_queue.apply_classification(Ticket(description="x"), result)
+    # Recorded on the incident, so duplicates inherit it instead of resolving again
+    assert index.incident_for(ticket).reusable_resolution == result["resolution"]
+
+
+def test_wait_past_returns_early_while_stage_is_in_backoff(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, "llm_backoff", lambda task: 30.0)
+    ticket = _ticket("Password locked")
+    queue.enqueue(ticket)
+    started = time.monotonic()
+    assert queue.wait_past(ticket.ticket_id, "classify", timeout=5) is None
+    assert time.monotonic() - started < 1
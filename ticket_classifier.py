@@ -0,0 +1,22 @@
+import json
+from functools import lru_cache
+
+import joblib
+
+from train_classifier import MAPPING_PATH, MODEL_PATH
+
+
+@lru_cache(maxsize=2)
+def load_classifier(model_path: str = MODEL_PATH, mapping_path: str = MAPPING_PATH):
+    """Category pipeline and id -> label mapping, loaded once per process"""
+    model = joblib.load(model_path)
+    with open(mapping_path) as f:
+        id2label = json.load(f)["id2label"]
+    return model, id2label
+
+
+def classify_category(description: str):
+    """SVM category of a ticket, split on "/" (last part is the sub-category)"""
+    model, id2label = load_classifier()
+    pred = model.predict([description])[0]
+    return id2label[str(pred)].split("/")
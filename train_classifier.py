@@ -0,0 +1,302 @@
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.svm import LinearSVC
+
+# ---------- Settings ----------
+MODEL_PATH = "models/svm_tfidf_pipeline.pkl"
+MAPPING_PATH = "mappings/label_mappings.json"
+TEXT_FIELD = "description"
+LABEL_FIELD = "label"
+CV_FOLDS = 5
+BATCH_SIZE = 10000       # Tickets per partial_fit call in streaming mode
+TUNE_SAMPLE = 20000      # Reservoir size used for the streaming grid search
+HOLDOUT_EVERY = 10       # Every Nth ticket is held out for streaming evaluation
+HASH_FEATURES = 2 ** 20
+
+FULL_PARAM_GRID = {
+    "features__word_tfidf__ngram_range": [(1, 1), (1, 2)],
+    "features__word_tfidf__max_features": [10000, 50000],
+    "features__char_tfidf__ngram_range": [(2, 4), (3, 5)],
+    "features__char_tfidf__max_features": [5000, 20000],
+    "svm__C": [0.1, 1.0, 10.0],
+}
+STREAMING_PARAM_GRID = {
+    "svm__alpha": [1e-6, 1e-5, 1e-4],
+}
+
+
+# ---------- Data ----------
+def iter_tickets(path: str, text_field=TEXT_FIELD, label_field=LABEL_FIELD):
+    """Yield (text, label) pairs from a ticket JSONL corpus without loading it all"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping malformed line {line_no}:", e)
+                continue
+            text, label = record.get(text_field), record.get(label_field)
+            if text and label:
+                yield str(text), str(label)
+
+
+def iter_batches(pairs, batch_size=BATCH_SIZE):
+    """Group (text, label) pairs into lists of at most batch_size"""
+    texts, labels = [], []
+    for text, label in pairs:
+        texts.append(text)
+        labels.append(label)
+        if len(texts) >= batch_size:
+            yield texts, labels
+            texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+
+def split_holdout(pairs, holdout_every=HOLDOUT_EVERY, holdout=False):
+    """Deterministically route every Nth pair to the holdout stream"""
+    for i, pair in enumerate(pairs):
+        if (i % holdout_every == 0) == holdout:
+            yield pair
+
+
+def build_label_mapping(labels, existing=None):
+    """Build label2id/id2label, keeping ids from an existing mapping stable"""
+    label2id = dict(existing["label2id"]) if existing else {}
+    for label in labels:
+        if label not in label2id:
+            label2id[label] = len(label2id)
+    id2label = {str(i): label for label, i in label2id.items()}
+    return {"label2id": label2id, "id2label": id2label}
+
+
+def load_label_mapping(path=MAPPING_PATH):
+    if not Path(path).exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# ---------- Pipelines ----------
+def build_pipeline():
+    """TF-IDF + LinearSVC pipeline, same layout as models/svm_tfidf_pipeline.pkl"""
+    return Pipeline([
+        ("features", FeatureUnion([
+            ("word_tfidf", TfidfVectorizer(stop_words="english", ngram_range=(1, 2), max_features=10000)),
+            ("char_tfidf", TfidfVectorizer(analyzer="char", ngram_range=(2, 4), max_features=5000)),
+        ])),
+        ("svm", LinearSVC(class_weight="balanced")),
+    ])
+
+
+def build_streaming_pipeline():
+    """Stateless hashing features + hinge-loss SGD (a linear SVM) that supports partial_fit"""
+    return Pipeline([
+        ("features", HashingVectorizer(
+            stop_words="english", ngram_range=(1, 2), n_features=HASH_FEATURES,
+            alternate_sign=False, norm="l2",
+        )),
+        ("svm", SGDClassifier(loss="hinge", alpha=1e-5, random_state=42)),
+    ])
+
+
+def _cv(labels, folds=CV_FOLDS):
+    # Rare classes can't fill every fold; shrink the fold count rather than fail
+    smallest = min(np.bincount(labels)[np.unique(labels)])
+    return StratifiedKFold(n_splits=max(2, min(folds, smallest)), shuffle=True, random_state=42)
+
+
+def _grid_search(pipeline, param_grid, texts, labels, n_jobs):
+    search = GridSearchCV(
+        pipeline, param_grid, cv=_cv(labels), scoring="f1_macro", n_jobs=n_jobs, refit=True,
+    )
+    search.fit(texts, labels)
+    print(f"Best CV f1_macro: {search.best_score_:.4f} with {search.best_params_}")
+    return search
+
+
+def partial_fit_batch(pipeline, texts, labels, classes=None):
+    """Feed one batch to the SGD step; the hashing step needs no fitting"""
+    features = pipeline.named_steps["features"].transform(texts)
+    pipeline.named_steps["svm"].partial_fit(features, labels, classes=classes)
+
+
+# ---------- Training ----------
+def train_full(path, mapping=None, n_jobs=-1, text_field=TEXT_FIELD, label_field=LABEL_FIELD):
+    """In-memory grid search over the TF-IDF/LinearSVC pipeline"""
+    texts, raw_labels = [], []
+    for text, label in iter_tickets(path, text_field, label_field):
+        texts.append(text)
+        raw_labels.append(label)
+    if not texts:
+        raise ValueError(f"No labelled tickets found in {path}")
+
+    mapping = build_label_mapping(raw_labels, existing=mapping)
+    labels = np.array([mapping["label2id"][label] for label in raw_labels])
+
+    start = time.perf_counter()
+    search = _grid_search(build_pipeline(), FULL_PARAM_GRID, texts, labels, n_jobs)
+    stats = {"train_seconds": time.perf_counter() - start, "n_tickets": len(texts),
+             "cv_f1_macro": search.best_score_, "best_params": search.best_params_}
+    return search.best_estimator_, mapping, stats
+
+
+def train_streaming(path, mapping=None, pipeline=None, epochs=1, n_jobs=-1, batch_size=BATCH_SIZE,
+                    text_field=TEXT_FIELD, label_field=LABEL_FIELD):
+    """Out-of-core training with partial_fit; pass an existing pipeline to continue training it"""
+    # First pass: collect the label set and a bounded reservoir sample for tuning
+    rng = random.Random(42)
+    reservoir, seen_labels = [], []
+    n_train = 0
+    for text, label in split_holdout(iter_tickets(path, text_field, label_field)):
+        if label not in seen_labels:
+            seen_labels.append(label)
+        n_train += 1
+        if len(reservoir) < TUNE_SAMPLE:
+            reservoir.append((text, label))
+        else:
+            j = rng.randrange(n_train)
+            if j < TUNE_SAMPLE:
+                reservoir[j] = (text, label)
+    if not n_train:
+        raise ValueError(f"No labelled tickets found in {path}")
+
+    mapping = build_label_mapping(seen_labels, existing=mapping)
+    classes = np.array(sorted(mapping["label2id"].values()))
+    stats = {"n_tickets": n_train}
+
+    start = time.perf_counter()
+    if pipeline is None:
+        pipeline = build_streaming_pipeline()
+        sample_texts = [t for t, _ in reservoir]
+        sample_labels = np.array([mapping["label2id"][l] for _, l in reservoir])
+        if len(np.unique(sample_labels)) > 1:
+            search = _grid_search(pipeline, STREAMING_PARAM_GRID, sample_texts, sample_labels, n_jobs)
+            pipeline.set_params(**search.best_params_)
+            stats["cv_f1_macro"] = search.best_score_
+            stats["best_params"] = search.best_params_
+        # partial_fit needs the full class list on its first call
+        first_call_classes = classes
+    else:
+        known = pipeline.named_steps["svm"].classes_
+        if not np.isin(classes, known).all():
+            raise ValueError("Corpus contains labels the existing model was not trained on; "
+                             "retrain from scratch without --warm-start")
+        first_call_classes = None
+
+    for epoch in range(epochs):
+        for texts, labels in iter_batches(
+                split_holdout(iter_tickets(path, text_field, label_field)), batch_size):
+            y = np.array([mapping["label2id"][l] for l in labels])
+            partial_fit_batch(pipeline, texts, y, classes=first_call_classes)
+            first_call_classes = None
+        print(f"Epoch {epoch + 1}/{epochs} done")
+    stats["train_seconds"] = time.perf_counter() - start
+
+    # Score the held-out stream batch by batch so memory stays bounded
+    correct = total = 0
+    for texts, labels in iter_batches(
+            split_holdout(iter_tickets(path, text_field, label_field), holdout=True), batch_size):
+        y = np.array([mapping["label2id"].get(l, -1) for l in labels])
+        correct += int((pipeline.predict(texts) == y).sum())
+        total += len(y)
+    if total:
+        stats["holdout_accuracy"] = correct / total
+    return pipeline, mapping, stats
+
+
+def save_model(pipeline, mapping, model_path=MODEL_PATH, mapping_path=MAPPING_PATH):
+    Path(model_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(mapping_path).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pipeline, model_path)
+    with open(mapping_path, "w") as f:
+        json.dump(mapping, f, indent=4)
+    print(f"Saved model to {model_path} and mapping to {mapping_path}")
+
+
+# ---------- Benchmark ----------
+def benchmark_inference(pipeline, texts, batch_size=1000, single_calls=200):
+    """Measure batched and one-at-a-time prediction throughput"""
+    if not texts:
+        return {}
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        pipeline.predict(texts[i:i + batch_size])
+    batch_elapsed = time.perf_counter() - start
+
+    singles = texts[:single_calls]
+    start = time.perf_counter()
+    for text in singles:
+        pipeline.predict([text])
+    single_elapsed = time.perf_counter() - start
+
+    return {
+        "batch_tickets_per_second": len(texts) / batch_elapsed,
+        "single_tickets_per_second": len(singles) / single_elapsed,
+        "single_latency_ms": 1000 * single_elapsed / len(singles),
+    }
+
+
+def _sample_texts(path, limit, text_field, label_field):
+    texts = []
+    for text, _ in iter_tickets(path, text_field, label_field):
+        texts.append(text)
+        if len(texts) >= limit:
+            break
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the ticket category classifier from a JSONL corpus")
+    parser.add_argument("data", help="JSONL file with one ticket per line")
+    parser.add_argument("--mode", choices=["full", "streaming"], default="full",
+                        help="full: in-memory TF-IDF grid search; streaming: hashing + partial_fit")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="continue training the existing streaming model on new data")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--text-field", default=TEXT_FIELD)
+    parser.add_argument("--label-field", default=LABEL_FIELD)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--mapping-path", default=MAPPING_PATH)
+    parser.add_argument("--benchmark", action="store_true", help="report inference throughput after training")
+    args = parser.parse_args()
+
+    mapping = load_label_mapping(args.mapping_path)
+    if args.mode == "full":
+        if args.warm_start:
+            parser.error("--warm-start is only supported with --mode streaming")
+        pipeline, mapping, stats = train_full(
+            args.data, mapping, args.n_jobs, args.text_field, args.label_field)
+    else:
+        existing = joblib.load(args.model_path) if args.warm_start else None
+        if existing is not None and not hasattr(existing.named_steps["svm"], "partial_fit"):
+            parser.error(f"{args.model_path} is not a streaming model; train it with --mode streaming first")
+        pipeline, mapping, stats = train_streaming(
+            args.data, mapping, existing, args.epochs, args.n_jobs, args.batch_size,
+            args.text_field, args.label_field)
+
+    save_model(pipeline, mapping, args.model_path, args.mapping_path)
+
+    if args.benchmark:
+        texts = _sample_texts(args.data, 10000, args.text_field, args.label_field)
+        stats.update(benchmark_inference(pipeline, texts))
+    print(json.dumps(stats, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import re
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+# -------------------------
+# Shared stylesheet
+# -------------------------
+CSS = """
+.main-title {
+    font-size: 2.2rem;
+    font-weight: 700;
+    color: #2C3E50;
+    text-align: center;
+    margin-bottom: 1rem;
+}
+.subtitle {
+    font-size: 1rem;
+    color: #7F8C8D;
+    text-align: center;
+    margin-bottom: 2rem;
+}
+.ticket-card {
+    background-color: #ffffff;
+    padding: 25px;
+    border-radius: 14px;
+    box-shadow: 0 4px 16px rgba(0, 0, 0, 0.08);
+    margin-top: 20px;
+}
+.ticket-header {
+    font-size: 22px;
+    font-weight: 700;
+    color: #2c3e50;
+    margin-bottom: 20px;
+}
+.ticket-field {
+    font-size: 16px;
+    margin: 10px 0;
+    line-height: 1.5;
+}
+.ticket-label {
+    font-weight: 600;
+    color: #34495e;
+}
+.status-open {
+    background: #27ae60;
+    color: white;
+    padding: 3px 10px;
+    border-radius: 8px;
+    font-size: 14px;
+    font-weight: 600;
+}
+.status-pending {
+    background: #f39c12;
+    color: white;
+    padding: 3px 10px;
+    border-radius: 8px;
+    font-size: 14px;
+    font-weight: 600;
+}
+.status-closed {
+    background: #c0392b;
+    color: white;
+    padding: 3px 10px;
+    border-radius: 8px;
+    font-size: 14px;
+    font-weight: 600;
+}
+.section-title {
+    font-size: 18px;
+    font-weight: 600;
+    color: #2c3e50;
+    margin-top: 20px;
+    margin-bottom: 10px;
+}
+.card {
+    background: #ffffff;
+    border-radius: 12px;
+    padding: 20px;
+    margin: 20px 0;
+    box-shadow: 0 4px 12px rgba(0,0,0,0.08);
+}
+.ticket-summary {
+    background: linear-gradient(135deg, #f9fafb, #f3f4f6);
+    border-left: 6px solid #2563eb;
+}
+.workflow-step {
+    border-left: 4px solid #e5e7eb;
+    margin: 15px 0;
+    padding: 15px 20px;
+    border-radius: 8px;
+    background: #fafafa;
+    position: relative;
+}
+.workflow-step::before {
+    content: "●";
+    position: absolute;
+    left: -12px;
+    color: #2563eb;
+    font-size: 20px;
+}
+.ai {
+    border-left-color: #2563eb;
+    background: #f0f7ff;
+}
+.human {
+    border-left-color: #dc2626;
+    background: #fff5f5;
+}
+.step-title {
+    font-weight: 600;
+    font-size: 16px;
+    margin-bottom: 6px;
+}
+.badge {
+    display: inline-block;
+    padding: 2px 8px;
+    border-radius: 6px;
+    font-size: 12px;
+    font-weight: 600;
+    margin-left: 8px;
+}
+.success { background: #27ae60; color: white; }
+.warning { background: #f39c12; color: white; }
+.error { background: #c0392b; color: white; }
+"""
+
+# Minified once per process; every page emits this single block instead of its own
+STYLESHEET = "<style>" + re.sub(r"\s*([{};:,])\s*", r"\1", re.sub(r"\s+", " ", CSS)).strip() + "</style>"
+
+CARD_CACHE_SIZE = 1024
+# Every ticket field a card layout renders; the card cache is keyed on their values
+CARD_FIELDS = ("status", "raised_on", "category", "sub_category", "priority", "assignment_group", "description")
+
+
+def inject_css():
+    """Emit the shared stylesheet once for this script run.
+
+    Fragment reruns don't re-execute the page body, so they never re-send it.
+    """
+    st.markdown(STYLESHEET, unsafe_allow_html=True)
+
+
+# -------------------------
+# Ticket cards
+# -------------------------
+_card_cache = OrderedDict()
+_card_cache_lock = threading.Lock()
+
+
+def _status_class(status: str) -> str:
+    if status.lower() == "closed":
+        return "status-closed"
+    if status.lower() == "pending":
+        return "status-pending"
+    return "status-open"
+
+
+def _build_card(ticket, layout: str) -> str:
+    if layout == "details":
+        status = str(ticket.status)
+        return f"""
+    <div class='ticket-card'>
+        <div class='ticket-header'>🎫 Ticket Details</div>
+        <div class="ticket-field"><span class="ticket-label">📂 Status:</span> <span class="{_status_class(status)}">{status}</span></div>
+        <div class="ticket-field"><span class="ticket-label">📅 Raised On:</span> {ticket.raised_on}</div>
+        <div class="ticket-field"><span class="ticket-label">🏷️ Category:</span> {ticket.category}</div>
+        <div class="ticket-field"><span class="ticket-label">🔖 Sub Category:</span> {ticket.sub_category}</div>
+        <div class="ticket-field"><span class="ticket-label">⚡ Priority:</span> {ticket.priority}</div>
+        <div class="ticket-field"><span class="ticket-label">👥 Assignment Group:</span> {ticket.assignment_group}</div>
+    </div>
+    """
+    if layout == "compact":
+        return f"""
+                    <div style="background-color:#F9F9F9; padding:15px; border-radius:10px; border:1px solid #ddd;">
+                        <b>Description:</b> {ticket.description}<br>
+                        <b>Category:</b> {ticket.category} → {ticket.sub_category}<br>
+                        <b>Assignment Group:</b> {ticket.assignment_group}<br>
+                        <b>Priority:</b> {ticket.priority}
+                    </div>
+                    """
+    return f"""
+        <div class="card ticket-summary">
+            <h4>🎫 Ticket Summary</h4>
+            <p><b>Status:</b> {ticket.status} <br>
+            <b>Raised On:</b> {ticket.raised_on} <br>
+            <b>Category:</b> {ticket.category} → {ticket.sub_category} <br>
+            <b>Priority:</b> {ticket.priority} <br>
+            <b>Assignment Group:</b> {ticket.assignment_group} <br>
+            <b>User Query:</b> {ticket.description}</p>
+        </div>
+        """
+
+
+def ticket_card_html(ticket, layout: str = "summary") -> str:
+    """Card HTML for a ticket, memoized on the rendered field values and layout"""
+    key = (layout,) + tuple(str(getattr(ticket, field)) for field in CARD_FIELDS)
+    with _card_cache_lock:
+        if key in _card_cache:
+            _card_cache.move_to_end(key)
+            return _card_cache[key]
+    html = _build_card(ticket, layout)
+    with _card_cache_lock:
+        _card_cache[key] = html
+        if len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    return html
+
+
+def render_ticket_card(ticket, layout: str = "summary"):
+    st.markdown(ticket_card_html(ticket, layout), unsafe_allow_html=True)
+
+
+# -------------------------
+# Workflow steps
+# -------------------------
+# Automation status -> (badge class, badge label)
+STEP_BADGES = {
+    "pending": ("warning", "Queued"),
+    "running": ("warning", "Running"),
+    "success": ("success", "Success"),
+    "failed": ("error", "Failed"),
+    "timeout": ("error", "Timed out"),
+    "blocked": ("error", "Blocked"),
+    "skipped": ("warning", "Skipped"),
+    "manual": ("warning", "Manual"),
+}
+
+
+def step_html(run) -> str:
+    badge_class, badge_label = STEP_BADGES[run.status]
+    return f"""
+                <div class="workflow-step ai">
+                    <div class="step-title">🤖 Step {run.number}: {run.text} <span class="badge {badge_class}">{badge_label}</span></div>
+                    {run.message}
+                </div>
+                """
+
+
+def escalation_html(step_count: int, assignment_group) -> str:
+    return f"""
+                                <div class="workflow-step ai">
+                                    <div class="step-title">🤖 Step {step_count}: Assigning Support Staff <span class="badge success">Suppport staff Assigned</span></div>
+                                    Assigned to <b>{assignment_group}</b>.
+                                </div>
+
+                                <div class="workflow-step human">
+                                    <div class="step-title">👨‍💻 Step {step_count + 1}: Support Team is working on resolution <span class="badge warning">In Progress</span></div>
+                                    Assigned to <b>{assignment_group}</b>. Resolution in progress.
+                                </div>
+                                """
+
+
+def _runs_key(ticket, name: str) -> str:
+    return f"automation_runs:{name}:{ticket.ticket_id}:{ticket.version}"
+
+
+def finished_runs(ticket, name: str):
+    """Step runs already executed this session for this version of the ticket, or None"""
+    return st.session_state.get(_runs_key(ticket, name))
+
+
+def store_finished_runs(ticket, name: str, runs):
+    """Keep executed runs so later reruns render them instead of invoking the executor again"""
+    st.session_state[_runs_key(ticket, name)] = runs
+
+
+def clear_finished_runs(ticket, name: str):
+    """Forget the stored runs so the next run executes the plan again"""
+    st.session_state.pop(_runs_key(ticket, name), None)
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from classes.ticket import Ticket
+from classifyAndResolve import RESOLVER_PROMPT, classify_ticket, classify_ticket_rules, llm_backoff, resolve_ticket
+from context_packer import context_budget, tokenizer_for
+from ticket_classifier import classify_category
+
+# ---------- Settings ----------
+DB_PATH = "work_queue.db"
+NUM_WORKERS = 4
+MAX_DEPTH = 10000          # enqueue() refuses new tickets beyond this many queued
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5.0
+IDLE_POLL = 0.5
+CLASSIFY_WAIT = 20.0       # Seconds the UI waits for a new ticket's classify stage
+RESOLVE_WAIT = 60.0        # Seconds the UI waits for a queued ticket's resolution
+CLASSIFICATION_FIELDS = ["category", "sub_category", "assignment_group", "priority"]
+PRIORITY_RANK = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
+STAGES = ["classify", "retrieve", "resolve"]
+LLM_TASKS = {"classify": "classify", "resolve": "resolve"}  # stage -> routed LLM task
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    assignment_group TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,           -- queued | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,      -- when the current stage became runnable
+    available_at REAL NOT NULL,     -- retry delay
+    finished_at REAL,
+    payload TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority_rank, enqueued_at);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised by enqueue() when the queue is at MAX_DEPTH"""
+
+
+def _ticket_to_dict(ticket: Ticket) -> dict:
+    return dict(vars(ticket))
+
+
+def _ticket_from_dict(data: dict) -> Ticket:
+    ticket = Ticket.__new__(Ticket)
+    ticket.__dict__.update(data)
+    return ticket
+
+
+class WorkQueue:
+    """SQLite-backed priority queue of ticket pipeline stages.
+
+    Each stage (classify -> retrieve -> resolve) is dequeued separately, so a Critical
+    ticket overtakes lower priorities between stages. Within a priority, assignment
+    groups are served round-robin.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_depth=MAX_DEPTH):
+        self.max_depth = max_depth
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._last_served = {}        # assignment group -> serve counter
+        self._serve_counter = 0
+        self._waits = {p: deque(maxlen=500) for p in PRIORITY_RANK}
+        self._completed = 0
+        self._failed = 0
+        with self._lock, self._conn:
+            # Stages interrupted by a restart go back in the queue
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def enqueue(self, ticket: Ticket) -> int:
+        """Queue a new ticket; priority is provisional (keyword rules) until classified"""
+        if self.depth() >= self.max_depth:
+            raise QueueFullError(f"Work queue is full ({self.max_depth} tickets)")
+        if ticket.priority is None or ticket.assignment_group is None:
+            provisional = classify_ticket_rules(ticket.description)
+            priority = ticket.priority or provisional["priority"]
+            group = ticket.assignment_group or provisional["assignment_group"]
+        else:
+            priority, group = ticket.priority, ticket.assignment_group
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (ticket_id, priority, priority_rank, assignment_group, stage, status,"
+                " created_at, enqueued_at, available_at, payload) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (ticket.ticket_id, priority, PRIORITY_RANK.get(priority, 2), group, STAGES[0],
+                 now, now, now, json.dumps({"ticket": _ticket_to_dict(ticket)})),
+            )
+            return cur.lastrowid
+
+    def dequeue(self, stages=None):
+        """Claim the next runnable stage: best priority first, then least recently served group"""
+        now = time.time()
+        stage_filter, params = "", [now]
+        if stages is not None:
+            if not stages:
+                return None
+            stage_filter = f" AND stage IN ({','.join('?' * len(stages))})"
+            params += list(stages)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT MIN(priority_rank) FROM jobs WHERE status = 'queued' AND available_at <= ?{stage_filter}",
+                params,
+            ).fetchone()
+            if row[0] is None:
+                return None
+            # Oldest job of every group at the best priority; pick the group served longest ago
+            heads = self._conn.execute(
+                "SELECT id, assignment_group, MIN(enqueued_at) FROM jobs WHERE status = 'queued'"
+                f" AND available_at <= ?{stage_filter} AND priority_rank = ? GROUP BY assignment_group",
+                params + [row[0]],
+            ).fetchall()
+            job_id, group, _ = min(heads, key=lambda h: (self._last_served.get(h[1], -1), h[2]))
+            self._serve_counter += 1
+            self._last_served[group] = self._serve_counter
+            self._conn.execute("UPDATE jobs SET status = 'running' WHERE id = ?", (job_id,))
+            job = self._conn.execute(
+                "SELECT id, priority, stage, attempts, enqueued_at, payload FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        priority = job[1]
+        self._waits.setdefault(priority, deque(maxlen=500)).append(now - job[4])
+        return {"id": job[0], "priority": priority, "stage": job[2], "attempts": job[3],
+                "payload": json.loads(job[5])}
+
+    def advance(self, job, payload):
+        """Stage finished: queue the next stage, re-ranked by the ticket's current priority"""
+        ticket = payload["ticket"]
+        next_index = STAGES.index(job["stage"]) + 1
+        now = time.time()
+        with self._lock, self._conn:
+            if next_index == len(STAGES):
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'done', finished_at = ?, payload = ? WHERE id = ?",
+                    (now, json.dumps(payload), job["id"]),
+                )
+                self._completed += 1
+                return
+            priority = ticket.get("priority") or job["priority"]
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = ?, attempts = 0, priority = ?, priority_rank = ?,"
+                " assignment_group = ?, enqueued_at = ?, available_at = ?, payload = ? WHERE id = ?",
+                (STAGES[next_index], priority, PRIORITY_RANK.get(priority, 2),
+                 ticket.get("assignment_group") or "", now, now, json.dumps(payload), job["id"]),
+            )
+
+    def fail(self, job, error: str, delay=RETRY_DELAY):
+        """Retry the stage later, or give up after MAX_ATTEMPTS"""
+        attempts = job["attempts"] + 1
+        now = time.time()
+        with self._lock, self._conn:
+            if attempts >= MAX_ATTEMPTS:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', attempts = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (attempts, error, now, job["id"]),
+                )
+                self._failed += 1
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = ?, error = ?, available_at = ? WHERE id = ?",
+                    (attempts, error, now + delay, job["id"]),
+                )
+
+    def result(self, ticket_id: str):
+        """Latest job state for a ticket: status, stage, error and the stage outputs (ticket, context, resolution)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, stage, payload, error FROM jobs WHERE ticket_id = ? ORDER BY id DESC LIMIT 1",
+                (ticket_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "stage": row[1], "error": row[3], **json.loads(row[2])}
+
+    def wait_past(self, ticket_id: str, stage: str, timeout=CLASSIFY_WAIT, poll=0.2):
+        """Block until the ticket's job has finished `stage` (or failed).
+
+        None on timeout, or as soon as the job sits queued behind an LLM backoff, so the
+        UI doesn't hang through a provider outage.
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.result(ticket_id)
+            if job is not None and (job["status"] in ("done", "failed")
+                                    or STAGES.index(job["stage"]) > STAGES.index(stage)):
+                return job
+            if job is not None and job["status"] == "queued" and stage_backoff(job["stage"]) > 0:
+                return None
+            if time.time() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def recent(self, limit=50):
+        """Most recently queued tickets with their progress and outcome, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ticket_id, priority, assignment_group, stage, status, attempts, created_at, finished_at,"
+                " payload, error FROM jobs ORDER BY id DESC LIMIT ?", (limit,),
+            ).fetchall()
+        jobs = []
+        for ticket_id, priority, group, stage, status, attempts, created_at, finished_at, payload, error in rows:
+            payload = json.loads(payload)
+            jobs.append({"ticket_id": ticket_id, "description": payload["ticket"]["description"],
+                         "priority": priority, "assignment_group": group, "stage": stage, "status": status,
+                         "attempts": attempts, "created_at": created_at, "finished_at": finished_at,
+                         "error": error, "ticket": payload["ticket"], "resolution": payload.get("resolution")})
+        return jobs
+
+    def metrics(self) -> dict:
+        """Queue depth per priority/stage and dequeue wait times in seconds"""
+        now = time.time()
+        with self._lock:
+            depth = dict(self._conn.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY priority").fetchall())
+            by_stage = dict(self._conn.execute(
+                "SELECT stage, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY stage").fetchall())
+            running = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            oldest = dict(self._conn.execute(
+                "SELECT priority, MIN(enqueued_at) FROM jobs WHERE status = 'queued' GROUP BY priority").fetchall())
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[priority] = {
+                "avg": sum(ordered) / len(ordered) if ordered else 0.0,
+                "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0,
+                "oldest_queued": now - oldest[priority] if priority in oldest else 0.0,
+            }
+        return {
+            "depth": sum(depth.values()),
+            "depth_by_priority": depth,
+            "depth_by_stage": by_stage,
+            "running": running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "wait_seconds": waits,
+            "llm_backoff_seconds": {task: llm_backoff(task) for task in set(LLM_TASKS.values())},
+        }
+
+
+# ---------- Pipeline stages ----------
+def stage_backoff(stage: str) -> float:
+    """Seconds a stage is held back because its LLM provider is rate limited or degraded"""
+    task = LLM_TASKS.get(stage)
+    return llm_backoff(task) if task else 0.0
+
+
+def ticket_from_job(job) -> Ticket:
+    """The queued ticket as of its latest stage, with the resolution attached once resolved"""
+    ticket = _ticket_from_dict(job["ticket"])
+    if job.get("resolution") is not None:
+        ticket.resolution_details = job["resolution"]
+    return ticket
+
+
+def apply_classification(ticket: Ticket, job) -> bool:
+    """Copy the queue's classification onto a ticket once its classify stage is done"""
+    if job is None or (job["status"] != "done" and job["stage"] == STAGES[0]):
+        return False
+    for field in CLASSIFICATION_FIELDS:
+        if getattr(ticket, field) != job["ticket"].get(field):
+            setattr(ticket, field, job["ticket"].get(field))
+    return True
+
+
+def _classify(ticket: Ticket, _retriever):
+    classification = classify_category(ticket.description)
+    ticket.category = ''.join(classification[:-1])
+    ticket.sub_category = classification[-1]
+    response = classify_ticket(ticket.print_ticket())
+    ticket.assignment_group = response.get("assignment_group")
+    ticket.priority = response.get("priority")
+    return {"degraded": "rules fallback" in response.get("signals", [])}
+
+
+def _retrieve(ticket: Ticket, retriever):
+    from RAG import scope_for_ticket
+    results = retriever.query(ticket.description, top_k=4, **scope_for_ticket(ticket))
+    budget = context_budget(RESOLVER_PROMPT, ticket.description)
+    return {"context": retriever.get_prompt_text(results, max_tokens=budget, query=ticket.description,
+                                                 tokenizer_name=tokenizer_for("resolve"))}
+
+
+def _resolve(ticket: Ticket, _retriever, context=""):
+    from incident_index import get_incident_index
+    resolution = resolve_ticket(ticket.description, context)
+    ticket.resolution_details = resolution
+    # Near-duplicates that arrive later inherit it instead of resolving again
+    get_incident_index().set_resolution(ticket, resolution)
+    return {"resolution": resolution, "degraded": "error" in resolution}
+
+
+STAGE_FUNCS = {"classify": _classify, "retrieve": _retrieve, "resolve": _resolve}
+
+
+class WorkerPool:
+    """Async workers draining a WorkQueue; blocking stage work runs in threads"""
+
+    def __init__(self, queue: WorkQueue, num_workers=NUM_WORKERS, retriever_factory=None):
+        self.queue = queue
+        self.num_workers = num_workers
+        self._retriever_factory = retriever_factory
+        self._retriever = None
+        self._retriever_lock = threading.Lock()
+        self._stopping = asyncio.Event()
+
+    def _get_retriever(self):
+        with self._retriever_lock:
+            if self._retriever is None:
+                if self._retriever_factory is None:
+                    from RAG import RAGRetriever
+                    self._retriever_factory = RAGRetriever
+                self._retriever = self._retriever_factory()
+            return self._retriever
+
+    def _runnable_stages(self):
+        """Stages whose LLM is not in backoff, and the shortest backoff among the rest"""
+        stages, waits = [], []
+        for stage in STAGES:
+            wait_for = stage_backoff(stage)
+            if wait_for > 0:
+                waits.append(wait_for)
+            else:
+                stages.append(stage)
+        return stages, min(waits) if waits else 0.0
+
+    def _run_stage(self, job):
+        payload = job["payload"]
+        ticket = _ticket_from_dict(payload["ticket"])
+        retriever = self._get_retriever() if job["stage"] == "retrieve" else None
+        kwargs = {"context": payload.get("context", "")} if job["stage"] == "resolve" else {}
+        updates = STAGE_FUNCS[job["stage"]](ticket, retriever, **kwargs)
+        degraded = updates.pop("degraded", False)
+        payload.update(updates)
+        payload["ticket"] = _ticket_to_dict(ticket)
+        return payload, degraded
+
+    async def _worker(self):
+        while not self._stopping.is_set():
+            stages, backoff = self._runnable_stages()
+            job = self.queue.dequeue(stages)
+            if job is None:
+                # Backpressure: nothing runnable while the provider is rate limited or degraded
+                await asyncio.sleep(min(backoff, IDLE_POLL * 4) if backoff else IDLE_POLL)
+                continue
+            try:
+                payload, degraded = await asyncio.to_thread(self._run_stage, job)
+            except Exception as e:
+                print(f"Stage {job['stage']} failed for job {job['id']}:", e)
+                self.queue.fail(job, str(e))
+                continue
+            if degraded and job["attempts"] + 1 < MAX_ATTEMPTS:
+                # The LLM failed and the stage fell back to rules/escalation; retry once the
+                # provider has recovered, and only keep the fallback answer on the last attempt
+                task = LLM_TASKS.get(job["stage"])
+                self.queue.fail(job, "LLM unavailable, used fallback", max(RETRY_DELAY, llm_backoff(task)))
+                continue
+            self.queue.advance(job, payload)
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.num_workers)))
+
+    def stop(self):
+        self._stopping.set()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def start_background_workers(db_path=DB_PATH, num_workers=NUM_WORKERS):
+    """Run a WorkerPool on its own event loop thread (once per process); returns the queue"""
+    global _background
+    with _background_lock:
+        if _background is None:
+            queue = WorkQueue(db_path)
+            pool = WorkerPool(queue, num_workers)
+            thread = threading.Thread(target=asyncio.run, args=(pool.run(),), daemon=True, name="work-queue")
+            thread.start()
+            _background = (queue, pool, thread)
+        return _background[0]
+
+
+if __name__ == "__main__":
+    asyncio.run(WorkerPool(WorkQueue(), NUM_WORKERS).run())
@@ -0,0 +1,69 @@
+import streamlit as st
+from classes.ticket import Ticket
+from work_queue import QueueFullError, start_background_workers, ticket_from_job
+
+queue = start_background_workers()
+
+st.title("📥 Ticket Work Queue")
+st.markdown(
+    "Queued tickets are classified, matched against the knowledge base and resolved by background workers. "
+    "Critical tickets are always picked first; within a priority, assignment groups take turns."
+)
+st.divider()
+
+with st.form(key="enqueue_form"):
+    bulk = st.text_area("Tickets to queue (one per line):", height=120)
+    if st.form_submit_button("📨 Queue Tickets"):
+        queued = 0
+        for line in bulk.splitlines():
+            if not line.strip():
+                continue
+            try:
+                queue.enqueue(Ticket(description=line.strip()))
+                queued += 1
+            except QueueFullError as e:
+                st.error(f"⚠️ {e}")
+                break
+        if queued:
+            st.success(f"✅ {queued} ticket(s) queued.")
+
+metrics = queue.metrics()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Queued", metrics["depth"])
+col2.metric("Running", metrics["running"])
+col3.metric("Completed", metrics["completed"])
+col4.metric("Failed", metrics["failed"])
+
+st.markdown("#### ⏱️ Wait time by priority (seconds)")
+st.dataframe(
+    [{"priority": p, "queued": metrics["depth_by_priority"].get(p, 0), **w}
+     for p, w in metrics["wait_seconds"].items()],
+    use_container_width=True, hide_index=True,
+)
+st.markdown("#### 🧾 Recent tickets")
+jobs = queue.recent()
+if jobs:
+    st.dataframe(
+        [{"ticket": j["ticket_id"], "description": j["description"][:80], "priority": j["priority"],
+          "group": j["assignment_group"], "stage": j["stage"], "status": j["status"],
+          "outcome": (j["resolution"] or {}).get("Solvability", ""), "error": j["error"] or ""}
+         for j in jobs],
+        use_container_width=True, hide_index=True,
+    )
+    resolved = {j["ticket_id"]: j for j in jobs if j["status"] == "done"}
+    if resolved:
+        choice = st.selectbox("Resolved ticket", list(resolved),
+                              format_func=lambda t: f"{t} - {resolved[t]['description'][:60]}")
+        if st.button("📂 Open Resolution"):
+            ticket = ticket_from_job(resolved[choice])
+            st.session_state["ticket"] = ticket
+            st.session_state["Resolution"] = ticket.resolution_details
+            st.switch_page("resolution_page.py")
+else:
+    st.write("No tickets queued yet.")
+
+backoff = {task: round(s, 1) for task, s in metrics["llm_backoff_seconds"].items() if s > 0}
+if backoff:
+    st.warning(f"⏸️ LLM rate limited or degraded, holding work for: {backoff}")
+if st.button("🔄 Refresh"):
+    st.rerun()